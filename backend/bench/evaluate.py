@@ -0,0 +1,377 @@
+# backend/bench/evaluate.py
+# Offline evaluation of the NLP pipeline on dataset.csv. Streams every labelled
+# command through the intent and entity stages in-process (no HTTP server) and
+# reports quality and speed side by side:
+#   - intent accuracy, per-intent precision/recall and the confusion matrix
+#   - how often the entity an intent needs was found
+#   - throughput, per-stage latency percentiles and peak memory
+# It can also write a cProfile file and collapsed stacks of the hot path.
+#
+# Usage (from the backend folder):
+# python -m bench.evaluate                                  # local intent model, 20% held out
+# python -m bench.evaluate --intent-mode hybrid --stand-in  # ambiguous commands go to a local fake Space
+# python -m bench.evaluate --no-entities --repeat 20        # intent stage only, 20 passes
+# python -m bench.evaluate --cprofile eval.prof             # then: python -m pstats eval.prof / snakeviz eval.prof
+# python -m bench.evaluate --collapsed eval.folded          # then: flamegraph.pl eval.folded > eval.svg
+# python -m bench.evaluate --json current.json --baseline baseline.json   # exits 1 on regressions
+# py-spy works on it directly too: py-spy record -o eval.svg -- python -m bench.evaluate
+
+import argparse
+import cProfile
+import csv
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+from bench.load_test import summarize
+from nlp.local_intent import DATASET_PATH
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The entity each intent needs (see NER_FIELDS in nlp/entity_extractor.py);
+# play_music counts as resolved if any of its fields was found.
+REQUIRED_ENTITIES = {
+    "get_weather": ("location",),
+    "navigate": ("location",),
+    "call_person": ("contact_name",),
+    "play_music": ("artist", "language", "mood"),
+}
+
+# --- 1. Streaming the Dataset ---
+def read_rows(path: str = DATASET_PATH):
+    """Yields (text, intent) pairs without loading the whole file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            text, intent = (row.get("text") or "").strip(), (row.get("intent") or "").strip()
+            if text and intent:
+                yield text, intent
+
+def split_holdout(path: str, fraction: float, seed: int = 0) -> tuple:
+    """
+    Returns:
+        tuple: (train_rows, test_rows). The split is deterministic for a given seed.
+    """
+    rows = list(read_rows(path))
+    random.Random(seed).shuffle(rows)
+    cut = int(len(rows) * fraction)
+    return rows[cut:], rows[:cut]
+
+# --- 2. Collapsed-Stack Sampler ---
+class StackSampler(threading.Thread):
+    """
+    Samples the Python stack of every other thread at a fixed interval and
+    counts identical stacks. write() emits the "collapsed" format used by
+    flamegraph.pl, speedscope and py-spy (`frame;frame;frame count` per line,
+    root first), with the thread name as the root frame. Threads that aren't
+    running any backend code (e.g. the idle logging listener) are skipped.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack, in_backend = [], False
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_filename.startswith(BACKEND_DIR + os.sep):
+                        in_backend = True
+                        file_name = os.path.relpath(code.co_filename, BACKEND_DIR)
+                    else:
+                        file_name = os.path.basename(code.co_filename)
+                    stack.append(f"{code.co_name} ({file_name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if not in_backend:
+                    continue
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+# --- 3. The Evaluation Loop ---
+def evaluate(rows, run_entities: bool = True, repeat: int = 1, warmup: int = 20) -> dict:
+    """
+    Runs each (text, intent) row through the pipeline `repeat` times.
+
+    Returns:
+        dict: The report (quality, throughput and per-stage latency in ms).
+    """
+    from core.tracing import span, start_trace
+    from nlp.intent_classifier import get_intent
+
+    extract_entities = None
+    if run_entities:
+        from nlp.entity_extractor import extract_entities
+
+    rows = list(rows)
+    # Model loading and first-call overheads aren't part of the measurement
+    for text, intent in rows[:warmup]:
+        predicted = get_intent(text)
+        if extract_entities and predicted:
+            extract_entities(text, predicted)
+
+    confusion = defaultdict(Counter)  # true intent -> predicted intent -> count
+    entity_hits, entity_totals = Counter(), Counter()
+    stage_samples = defaultdict(list)
+    command_ms = []
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text, true_intent in rows:
+            trace = start_trace()
+            with span("intent"):
+                predicted = get_intent(text)
+            entities = None
+            if extract_entities and predicted:
+                with span("entities"):
+                    entities = extract_entities(text, predicted)
+            command_ms.append((time.perf_counter() - trace.started) * 1000)
+            for stage, seconds in trace.spans.items():
+                stage_samples[stage].append(seconds * 1000)
+
+            confusion[true_intent][predicted or "none"] += 1
+            if entities is not None and predicted == true_intent and true_intent in REQUIRED_ENTITIES:
+                entity_totals[true_intent] += 1
+                if any(entities.get(field) for field in REQUIRED_ENTITIES[true_intent]):
+                    entity_hits[true_intent] += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        "commands": len(command_ms),
+        "elapsed_s": elapsed,
+        "throughput_cps": len(command_ms) / elapsed if elapsed else 0.0,
+        "latency_ms": summarize(command_ms),
+        "stages_ms": {stage: summarize(samples) for stage, samples in sorted(stage_samples.items())},
+        **intent_quality(confusion),
+        "entity_found": {
+            intent: entity_hits[intent] / entity_totals[intent] for intent in sorted(entity_totals)
+        },
+    }
+
+def intent_quality(confusion: dict) -> dict:
+    """Accuracy, per-intent precision/recall/F1 and the confusion matrix."""
+    labels = sorted(set(confusion) | {p for row in confusion.values() for p in row})
+    total = sum(sum(row.values()) for row in confusion.values())
+    correct = sum(confusion[label][label] for label in confusion)
+    per_intent = {}
+    for label in sorted(confusion):
+        true_positive = confusion[label][label]
+        predicted = sum(row[label] for row in confusion.values())
+        actual = sum(confusion[label].values())
+        precision = true_positive / predicted if predicted else 0.0
+        recall = true_positive / actual if actual else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        per_intent[label] = {"precision": precision, "recall": recall, "f1": f1, "support": actual}
+    return {
+        "accuracy": correct / total if total else 0.0,
+        "per_intent": per_intent,
+        "confusion": {label: {p: confusion[label][p] for p in labels if confusion[label][p]} for label in sorted(confusion)},
+    }
+
+# --- 4. Reporting ---
+def print_report(report: dict):
+    print(f"\n--- Evaluation: {report['commands']} commands ({report['config']['intent_mode']} intents) ---")
+    print(f"Intent accuracy: {report['accuracy']:.3f}")
+    print(f"  {'intent':<20} {'precision':>9} {'recall':>7} {'f1':>6} {'support':>8}")
+    for intent, stats in report["per_intent"].items():
+        print(f"  {intent:<20} {stats['precision']:>9.3f} {stats['recall']:>7.3f} {stats['f1']:>6.3f} {stats['support']:>8}")
+
+    labels = sorted({p for row in report["confusion"].values() for p in row} | set(report["confusion"]))
+    width = max(len(label) for label in labels) + 2
+    print("\nConfusion matrix (rows: true intent, columns: predicted):")
+    print(" " * width + "".join(f"{label[:width - 2]:>{width}}" for label in labels))
+    for intent, row in report["confusion"].items():
+        print(f"{intent:<{width}}" + "".join(f"{row.get(label, 0):>{width}}" for label in labels))
+
+    if report["entity_found"]:
+        print("\nRequired entity found (correctly classified commands):")
+        for intent, rate in report["entity_found"].items():
+            print(f"  {intent:<20} {rate * 100:5.1f}%")
+
+    latency = report["latency_ms"]
+    print(f"\nThroughput: {report['throughput_cps']:.1f} commands/s over {report['elapsed_s']:.1f} s (one thread)")
+    print(f"Latency:    p50 {latency['p50']:.2f} ms | p95 {latency['p95']:.2f} ms | p99 {latency['p99']:.2f} ms | max {latency['max']:.2f} ms")
+    print("Per-stage (ms):")
+    for stage, summary in report["stages_ms"].items():
+        print(f"  {stage:<12} n={summary['count']:<6} p50 {summary['p50']:8.2f}  p95 {summary['p95']:8.2f}  p99 {summary['p99']:8.2f}")
+    memory = report["memory_mb"]
+    print(f"Memory:     peak RSS {memory['peak_rss']:.1f} MB" + (
+        f" | peak Python heap during the run {memory['peak_traced']:.1f} MB" if "peak_traced" in memory else ""
+    ))
+
+def find_regressions(report: dict, baseline: dict, max_regression: float, max_accuracy_drop: float) -> list:
+    """Lists quality and speed metrics that got worse than the baseline."""
+    problems = []
+    if report["accuracy"] < baseline["accuracy"] - max_accuracy_drop:
+        problems.append(f"accuracy: {baseline['accuracy']:.3f} -> {report['accuracy']:.3f}")
+    for intent, rate in baseline.get("entity_found", {}).items():
+        new_rate = report.get("entity_found", {}).get(intent)
+        if new_rate is not None and new_rate < rate - max_accuracy_drop:
+            problems.append(f"{intent} entity found: {rate:.3f} -> {new_rate:.3f}")
+    for key in ("p50", "p95"):
+        old, new = baseline["latency_ms"][key], report["latency_ms"][key]
+        if old and new > old * (1 + max_regression):
+            problems.append(f"latency {key}: {old:.2f} ms -> {new:.2f} ms")
+    old, new = baseline["throughput_cps"], report["throughput_cps"]
+    if old and new < old * (1 - max_regression):
+        problems.append(f"throughput: {old:.1f} -> {new:.1f} commands/s")
+    return problems
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+# --- 5. Entry Point ---
+def ensure_space(intent_classifier):
+    """
+    Connects the Gradio client before measuring.
+
+    Raises:
+        SystemExit: The Space isn't reachable, so hybrid/remote numbers would
+            silently be those of the local fallback.
+    """
+    from core.startup import components
+
+    components.ensure_sync("intent_space")
+    if components.state("intent_space") != "ready" or intent_classifier.client is None:
+        error = components.status().get("intent_space", {}).get("error", "not configured")
+        raise SystemExit(f"The intent Space at {intent_classifier.SPACE_URL or '(no URL)'} isn't ready: {error}")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Evaluate intent/entity quality and speed on dataset.csv.")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--intent-mode", default="local", choices=["hybrid", "local", "remote"])
+    parser.add_argument("--space-url", help="Gradio app to use in hybrid/remote mode (default: HF_SPACE_URL).")
+    parser.add_argument("--stand-in", action="store_true",
+                        help="Start the fake Space from bench/fake_services.py for hybrid/remote mode.")
+    parser.add_argument("--holdout", type=float, default=0.2,
+                        help="Fraction of the dataset the local intent model is NOT trained on and is scored on "
+                             "(0 scores the model on its own training data).")
+    parser.add_argument("--no-entities", action="store_true", help="Only run the intent stage.")
+    parser.add_argument("--limit", type=int, help="Only use the first N evaluation rows.")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the rows (longer runs for profiling).")
+    parser.add_argument("--warmup", type=int, default=20, help="Commands run before measuring.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Keep the command cache on (by default every pass runs the models).")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Also report peak Python heap usage (slows the run down).")
+    parser.add_argument("--cprofile", help="Write a cProfile file of the measured loop to this path.")
+    parser.add_argument("--collapsed", help="Write sampled collapsed stacks (flamegraph format) to this path.")
+    parser.add_argument("--sample-interval-ms", type=float, default=5.0)
+    parser.add_argument("--json", help="Write the report to this file.")
+    parser.add_argument("--baseline", help="A previous --json report to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="Allowed relative slowdown.")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01, help="Allowed absolute accuracy drop.")
+    args = parser.parse_args()
+
+    # The pipeline modules read their configuration at import, so it's set first
+    os.environ["INTENT_MODE"] = args.intent_mode
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if not args.cache:
+        os.environ["COMMAND_CACHE"] = "0"
+    stand_in = None
+    if args.stand_in and args.intent_mode != "local":
+        from bench.run_benchmark import free_port, start_fake, wait_until
+
+        port = free_port()
+        faults = argparse.Namespace(upstream_latency_ms=0.0, upstream_jitter_ms=0.0, upstream_error_rate=0.0)
+        stand_in = start_fake("gradio", port, faults)
+        args.space_url = f"http://127.0.0.1:{port}/"
+        wait_until(args.space_url, timeout=120, process=stand_in)
+    if args.space_url:
+        os.environ["HF_SPACE_URL"] = args.space_url
+
+    from core.logging_config import configure_logging
+    configure_logging()
+    import nlp.intent_classifier as intent_classifier
+    from nlp.local_intent import LocalIntentClassifier
+
+    if args.holdout > 0:
+        train, rows = split_holdout(args.dataset, args.holdout)
+        intent_classifier.local_classifier = LocalIntentClassifier.fit([t for t, _ in train], [i for _, i in train])
+    else:
+        rows = list(read_rows(args.dataset))
+    rows = rows[:args.limit] if args.limit else rows
+
+    profiler = cProfile.Profile() if args.cprofile else None
+    sampler = StackSampler(args.sample_interval_ms / 1000) if args.collapsed else None
+    try:
+        if args.intent_mode != "local":
+            # The Space client connects in the background when the app starts, and
+            # nothing starts it here, so without this every command would fall back
+            ensure_space(intent_classifier)
+        if args.tracemalloc:
+            tracemalloc.start()
+        if sampler:
+            sampler.start()
+        if profiler:
+            profiler.enable()
+        report = evaluate(rows, run_entities=not args.no_entities, repeat=args.repeat, warmup=args.warmup)
+    finally:
+        if profiler:
+            profiler.disable()
+        if sampler:
+            sampler.stop()
+        if stand_in is not None:
+            stand_in.terminate()
+
+    report["memory_mb"] = {"peak_rss": peak_rss_mb()}
+    if args.tracemalloc:
+        report["memory_mb"]["peak_traced"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    report["config"] = {
+        "intent_mode": args.intent_mode,
+        "holdout": args.holdout,
+        "entities": not args.no_entities,
+        "repeat": args.repeat,
+        "cache": args.cache,
+        "entity_backend": os.getenv("ENTITY_BACKEND", "torch"),
+    }
+
+    print_report(report)
+    if profiler:
+        profiler.dump_stats(args.cprofile)
+        print(f"\nWrote cProfile stats to {args.cprofile}")
+    if sampler:
+        sampler.write(args.collapsed)
+        print(f"Wrote {sum(sampler.stacks.values())} stack samples to {args.collapsed}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = find_regressions(report, json.load(f), args.max_regression, args.max_accuracy_drop)
+        if problems:
+            print("\nREGRESSIONS vs baseline:\n  " + "\n  ".join(problems))
+            return 1
+        print("\nNo regressions vs baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# backend/bench/fake_services.py
+# Local stand-ins for the external services the backend calls, so it can be
+# benchmarked without network access or API keys:
+#   gradio      - the intent classifier Space (a real Gradio app; needs `pip install gradio`)
+#   spotify     - the Spotify token and playlist search endpoints
+#   openweather - the OpenWeatherMap current-weather endpoint
+# Each one can inject latency and errors.
+#
+# Usage:
+# python -m bench.fake_services spotify --port 9101 --latency-ms 80 --jitter-ms 20 --error-rate 0.01
+
+import argparse
+import asyncio
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# --- 1. Fault Injection ---
+class FaultInjector:
+    """Adds a random delay to every call and fails a fraction of them."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+
+    def delay(self) -> float:
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def should_fail(self) -> bool:
+        return self._random.random() < self.error_rate
+
+# --- 2. Spotify ---
+def create_spotify_app(faults: FaultInjector) -> FastAPI:
+    app = FastAPI(title="Fake Spotify")
+
+    @app.post("/api/token")
+    async def token():
+        return {"access_token": "fake-token", "token_type": "Bearer", "expires_in": 3600}
+
+    @app.get("/v1/search")
+    async def search(q: str, type: str = "playlist", limit: int = 1):
+        await asyncio.sleep(faults.delay())
+        if faults.should_fail():
+            return JSONResponse(status_code=503, content={"error": {"status": 503, "message": "Injected failure"}})
+        playlist = {"name": f"{q.title()} Mix", "external_urls": {"spotify": f"https://open.spotify.com/playlist/{abs(hash(q))}"}}
+        return {"playlists": {"items": [playlist][:limit]}}
+
+    return app
+
+# --- 3. OpenWeatherMap ---
+def create_openweather_app(faults: FaultInjector) -> FastAPI:
+    app = FastAPI(title="Fake OpenWeatherMap")
+
+    @app.get("/data/2.5/weather")
+    async def weather(request: Request):
+        await asyncio.sleep(faults.delay())
+        if faults.should_fail():
+            return JSONResponse(status_code=503, content={"cod": 503, "message": "Injected failure"})
+        city = request.query_params.get("q", "")
+        # A stable, city-dependent temperature keeps responses realistic
+        temp = float(15 + sum(map(ord, city)) % 20)
+        return {
+            "name": city.title(),
+            "weather": [{"description": "scattered clouds"}],
+            "main": {"temp": temp, "feels_like": round(temp - 1.5, 1)},
+        }
+
+    return app
+
+# --- 4. Gradio Intent Space ---
+def create_gradio_app(faults: FaultInjector):
+    """A Gradio app exposing /predict with the same output format as the real Space."""
+    import gradio as gr
+
+    from nlp.local_intent import LocalIntentClassifier
+
+    classifier = LocalIntentClassifier.from_csv()
+
+    def predict(text):
+        time.sleep(faults.delay())
+        if faults.should_fail():
+            raise gr.Error("Injected failure")
+        intent, score = classifier.predict(text)
+        return f"Intent: {intent} (Score: {score:.4f})"
+
+    return gr.Interface(fn=predict, inputs="text", outputs="text", api_name="predict")
+
+# --- 5. Entry Point ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a stand-in for an external service.")
+    parser.add_argument("service", choices=["gradio", "spotify", "openweather"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean added latency per call.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter around the latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls that fail (0-1).")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    faults = FaultInjector(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    if args.service == "gradio":
+        # A high concurrency limit so the stand-in never becomes the bottleneck
+        create_gradio_app(faults).queue(default_concurrency_limit=256).launch(
+            server_name=args.host, server_port=args.port, show_error=True
+        )
+        return
+
+    import uvicorn
+
+    app = create_spotify_app(faults) if args.service == "spotify" else create_openweather_app(faults)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
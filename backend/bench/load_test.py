@@ -0,0 +1,174 @@
+# backend/bench/load_test.py
+# Drives POST /process-command with the commands in dataset.csv and reports latency
+# percentiles, throughput, error rate and the per-stage breakdown the backend
+# returns in its Server-Timing header.
+#
+# Usage (against a running backend):
+# python -m bench.load_test --url http://127.0.0.1:8000 --concurrency 32 --requests 2000
+# Compare with a saved run and fail on regressions:
+# python -m bench.load_test --json current.json --baseline baseline.json --max-regression 0.15
+
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import math
+import sys
+import time
+
+import httpx
+
+from nlp.local_intent import DATASET_PATH
+
+# --- 1. Helpers ---
+def load_commands(path: str = DATASET_PATH) -> list:
+    with open(path, newline="", encoding="utf-8") as f:
+        return [row["text"] for row in csv.DictReader(f) if row.get("text")]
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of `values` (fraction in [0, 1])."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+def parse_server_timing(header: str | None) -> dict:
+    """Parses 'intent;dur=1.2, ner;dur=8.0' into {'intent': 1.2, 'ner': 8.0} (milliseconds)."""
+    stages = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                try:
+                    stages[name] = float(value)
+                except ValueError:
+                    pass
+    return stages
+
+def summarize(latencies_ms: list) -> dict:
+    return {
+        "count": len(latencies_ms),
+        "mean": sum(latencies_ms) / len(latencies_ms) if latencies_ms else 0.0,
+        "p50": percentile(latencies_ms, 0.50),
+        "p95": percentile(latencies_ms, 0.95),
+        "p99": percentile(latencies_ms, 0.99),
+        "max": max(latencies_ms, default=0.0),
+    }
+
+# --- 2. The Load Generator ---
+async def run_load(base_url: str, texts: list, concurrency: int = 16, total_requests: int = 1000,
+                   duration: float | None = None, timeout: float = 30.0) -> dict:
+    """
+    Sends commands from `texts` (cycled) with `concurrency` requests in flight until
+    `total_requests` have been sent or `duration` seconds have passed.
+
+    Returns:
+        dict: The report (latency summary, throughput, errors, per-stage summaries).
+    """
+    commands = itertools.cycle(texts)
+    latencies, stage_samples, errors = [], {}, {}
+    sent = 0
+    deadline = time.perf_counter() + duration if duration else None
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+
+        async def worker():
+            nonlocal sent
+            while True:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                if deadline is None and sent >= total_requests:
+                    return
+                sent += 1
+                text = next(commands)
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/process-command", json={"text": text})
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    response, status = None, type(e).__name__
+                latency_ms = (time.perf_counter() - start) * 1000
+                if response is None or response.status_code != 200:
+                    errors[status] = errors.get(status, 0) + 1
+                    continue
+                latencies.append(latency_ms)
+                for stage, duration_ms in parse_server_timing(response.headers.get("server-timing")).items():
+                    stage_samples.setdefault(stage, []).append(duration_ms)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    error_count = sum(errors.values())
+    return {
+        "requests": len(latencies) + error_count,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "error_rate": error_count / max(1, len(latencies) + error_count),
+        "errors": errors,
+        "latency_ms": summarize(latencies),
+        "stages_ms": {stage: summarize(samples) for stage, samples in sorted(stage_samples.items())},
+    }
+
+# --- 3. Reporting ---
+def print_report(report: dict):
+    latency = report["latency_ms"]
+    print(f"\n--- Load test: {report['requests']} requests, concurrency {report['concurrency']} ---")
+    print(f"Throughput: {report['throughput_rps']:.1f} req/s over {report['elapsed_s']:.1f} s")
+    print(f"Errors:     {report['error_rate'] * 100:.2f}% {report['errors'] or ''}")
+    print(f"Latency:    p50 {latency['p50']:.1f} ms | p95 {latency['p95']:.1f} ms | p99 {latency['p99']:.1f} ms | max {latency['max']:.1f} ms")
+    if report["stages_ms"]:
+        print("Per-stage (server side, ms):")
+        for stage, summary in report["stages_ms"].items():
+            print(f"  {stage:<28} n={summary['count']:<6} p50 {summary['p50']:8.1f}  p95 {summary['p95']:8.1f}  p99 {summary['p99']:8.1f}")
+
+def find_regressions(report: dict, baseline: dict, max_regression: float) -> list:
+    """Lists the metrics that got worse than the baseline by more than max_regression."""
+    problems = []
+    for key in ("p50", "p95", "p99"):
+        old, new = baseline["latency_ms"][key], report["latency_ms"][key]
+        if old and new > old * (1 + max_regression):
+            problems.append(f"latency {key}: {old:.1f} ms -> {new:.1f} ms")
+    old, new = baseline["throughput_rps"], report["throughput_rps"]
+    if old and new < old * (1 - max_regression):
+        problems.append(f"throughput: {old:.1f} -> {new:.1f} req/s")
+    if report["error_rate"] > baseline["error_rate"] + 0.01:
+        problems.append(f"error rate: {baseline['error_rate']:.3f} -> {report['error_rate']:.3f}")
+    return problems
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="Total requests (ignored with --duration).")
+    parser.add_argument("--duration", type=float, default=None, help="Run for this many seconds instead.")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--json", help="Write the report to this file.")
+    parser.add_argument("--baseline", help="A previous --json report to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="Allowed relative slowdown vs the baseline.")
+
+def finish(report: dict, args) -> int:
+    """Prints and saves the report; returns the process exit code."""
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = find_regressions(report, json.load(f), args.max_regression)
+        if problems:
+            print("\nREGRESSIONS vs baseline:\n  " + "\n  ".join(problems))
+            return 1
+        print("\nNo regressions vs baseline.")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the /process-command endpoint.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    add_arguments(parser)
+    args = parser.parse_args()
+    report = asyncio.run(run_load(args.url, load_commands(args.dataset), args.concurrency, args.requests, args.duration))
+    sys.exit(finish(report, args))
@@ -0,0 +1,168 @@
+# backend/bench/replay.py
+# Re-drives commands captured in the request log (core/request_log.py, enabled
+# with REQUEST_LOG_PATH) against POST /process-command, keeping their original
+# spacing in time. --speed scales the rate up (2 = twice as fast), so real
+# traffic can be replayed at a multiple of its production load for capacity
+# testing. The report matches bench/load_test.py, so --baseline works the same.
+#
+# Commands logged with a session id are sent with one too, so follow-ups ("what
+# about tomorrow?") are served with their context as they were in production.
+# Each run maps the logged ids to fresh ones, and a session's commands are sent
+# in order, each after the previous one has been answered.
+#
+# Usage (against a running backend):
+# python -m bench.replay logs/requests.jsonl --url http://127.0.0.1:8000 --speed 4
+# Files written by several workers ("{pid}" in REQUEST_LOG_PATH) are merged:
+# python -m bench.replay logs/requests-*.jsonl
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+import uuid
+
+import httpx
+
+from bench.load_test import finish, parse_server_timing, summarize
+
+# --- 1. Reading the Log ---
+def log_files(path: str) -> list:
+    """The log at `path` and its rotated copies, oldest first (path.N ... path.1, path)."""
+    rotated = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        rotated.append(f"{path}.{index}")
+        index += 1
+    return list(reversed(rotated)) + ([path] if os.path.exists(path) else [])
+
+def read_log(paths: list) -> list:
+    """
+    Reads the records of one or more request logs, merged into timestamp order.
+    Lines that don't parse (e.g. a partial last line) are skipped.
+    """
+    records = []
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            for file_path in log_files(path):
+                with open(file_path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        if isinstance(record, dict) and record.get("text") and "ts" in record:
+                            records.append(record)
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+# --- 2. The Replay ---
+async def replay(base_url: str, records: list, speed: float = 1.0, max_in_flight: int = 256,
+                 timeout: float = 30.0) -> dict:
+    """
+    Sends each record's command at its original offset from the first one,
+    divided by `speed`. Requests are sent on schedule whether or not earlier ones
+    have finished (open loop), up to `max_in_flight` at once; past that, sends
+    fall behind schedule and the lag is reported.
+
+    Returns:
+        dict: The load_test report, plus the offered rate, schedule lag and how
+            many responses differ from the logged ones.
+    """
+    first_ts = records[0]["ts"] if records else 0.0
+    latencies, stage_samples, errors, lags = [], {}, {}, []
+    changed = 0
+    slots = asyncio.Semaphore(max_in_flight)
+    session_ids = {}  # logged session id -> this run's id
+    session_tails = {}  # logged session id -> task sending its latest command
+
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+
+        async def send(record: dict, previous: asyncio.Task | None):
+            nonlocal changed
+            if previous is not None:
+                # A follow-up only makes sense once the command before it was answered
+                await asyncio.wait({previous})
+            body = {"text": record["text"]}
+            if record.get("session_id"):
+                body["session_id"] = session_ids.setdefault(record["session_id"], uuid.uuid4().hex)
+            start = time.perf_counter()
+            try:
+                response = await client.post("/process-command", json=body)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                response, status = None, type(e).__name__
+            finally:
+                slots.release()
+            latency_ms = (time.perf_counter() - start) * 1000
+            if response is None or response.status_code != 200:
+                errors[status] = errors.get(status, 0) + 1
+                return
+            latencies.append(latency_ms)
+            for stage, duration_ms in parse_server_timing(response.headers.get("server-timing")).items():
+                stage_samples.setdefault(stage, []).append(duration_ms)
+            if "response" in record and response.json().get("response") != record["response"]:
+                changed += 1
+
+        started = time.perf_counter()
+        tasks = []
+        for record in records:
+            due = started + (record["ts"] - first_ts) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await slots.acquire()
+            lags.append(max(0.0, time.perf_counter() - due) * 1000)
+            session_id = record.get("session_id")
+            task = asyncio.create_task(send(record, session_tails.get(session_id)))
+            if session_id:
+                session_tails[session_id] = task
+            tasks.append(task)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    span_s = (records[-1]["ts"] - first_ts) / speed if records else 0.0
+    error_count = sum(errors.values())
+    return {
+        "requests": len(latencies) + error_count,
+        "concurrency": max_in_flight,
+        "speed": speed,
+        "offered_rps": len(records) / span_s if span_s else 0.0,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "error_rate": error_count / max(1, len(latencies) + error_count),
+        "errors": errors,
+        "responses_changed": changed,
+        "latency_ms": summarize(latencies),
+        "schedule_lag_ms": summarize(lags),
+        "stages_ms": {stage: summarize(samples) for stage, samples in sorted(stage_samples.items())},
+    }
+
+# --- Testing Block ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a captured request log against /process-command.")
+    parser.add_argument("logs", nargs="+", help="Request log files or glob patterns (rotated copies are included).")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="Rate multiplier; 2 replays twice as fast.")
+    parser.add_argument("--limit", type=int, help="Replay only the first N records.")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--json", help="Write the report to this file.")
+    parser.add_argument("--baseline", help="A previous --json report to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="Allowed relative slowdown vs the baseline.")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    records = read_log(args.logs)[:args.limit]
+    if not records:
+        sys.exit(f"No records found in {', '.join(args.logs)}")
+    report = asyncio.run(replay(args.url, records, args.speed, args.max_in_flight))
+    exit_code = finish(report, args)
+    lag = report["schedule_lag_ms"]
+    print(f"Offered:    {report['offered_rps']:.1f} req/s at {report['speed']:g}x the captured rate")
+    print(f"Send lag:   p50 {lag['p50']:.1f} ms | p99 {lag['p99']:.1f} ms (high values mean the client couldn't keep up)")
+    print(f"Responses that differ from the log: {report['responses_changed']}")
+    sys.exit(exit_code)
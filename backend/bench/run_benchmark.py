@@ -0,0 +1,130 @@
+# backend/bench/run_benchmark.py
+# One-command benchmark: starts the fake Gradio/Spotify/OpenWeather services,
+# starts the backend pointed at them, waits for /ready, runs the load test and
+# shuts everything down again.
+#
+# Usage (from the backend folder):
+# python -m bench.run_benchmark --concurrency 32 --requests 3000 --upstream-latency-ms 80
+# python -m bench.run_benchmark --intent-mode local --json baseline.json
+# python -m bench.run_benchmark --baseline baseline.json   # exits 1 on regressions
+# python -m bench.run_benchmark --workers 4                 # gunicorn with 4 preforked workers
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench.load_test import add_arguments, finish, load_commands, run_load
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_until(url: str, timeout: float, expect_status: int = 200, process: subprocess.Popen | None = None):
+    """Polls `url` until it answers with `expect_status` (or `process` exits)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"The process serving {url} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == expect_status:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} did not become available within {timeout:.0f} s")
+
+def start_fake(service: str, port: int, args) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "bench.fake_services", service, "--port", str(port),
+        "--latency-ms", str(args.upstream_latency_ms), "--jitter-ms", str(args.upstream_jitter_ms),
+        "--error-rate", str(args.upstream_error_rate),
+    ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend against local fake services.")
+    add_arguments(parser)
+    parser.add_argument("--intent-mode", default="hybrid", choices=["hybrid", "local", "remote"])
+    parser.add_argument("--upstream-latency-ms", type=float, default=50.0)
+    parser.add_argument("--upstream-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--startup-timeout", type=float, default=600.0, help="Seconds to wait for models to load.")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Serve with gunicorn and this many workers (default: one uvicorn process).")
+    parser.add_argument("--backend-arg", action="append", default=[],
+                        help="Extra argument for uvicorn/gunicorn (repeatable).")
+    args = parser.parse_args()
+
+    ports = {name: free_port() for name in ("backend", "gradio", "spotify", "openweather")}
+    env = dict(
+        os.environ,
+        INTENT_MODE=args.intent_mode,
+        HF_SPACE_URL=f"http://127.0.0.1:{ports['gradio']}/",
+        SPOTIFY_CLIENT_ID="bench",
+        SPOTIFY_CLIENT_SECRET="bench",
+        SPOTIFY_TOKEN_URL=f"http://127.0.0.1:{ports['spotify']}/api/token",
+        SPOTIFY_API_PREFIX=f"http://127.0.0.1:{ports['spotify']}/v1/",
+        OPENWEATHER_API_KEY="bench",
+        OPENWEATHER_BASE_URL=f"http://127.0.0.1:{ports['openweather']}/data/2.5/weather",
+        SERVER_TIMING="1",
+    )
+    if args.workers:
+        env["WEB_CONCURRENCY"] = str(args.workers)
+
+    processes = []
+    try:
+        services = ["spotify", "openweather"] + ([] if args.intent_mode == "local" else ["gradio"])
+        for service in services:
+            processes.append(start_fake(service, ports[service], args))
+        wait_until(f"http://127.0.0.1:{ports['openweather']}/docs", 30)
+        wait_until(f"http://127.0.0.1:{ports['spotify']}/docs", 30)
+        if "gradio" in services:
+            wait_until(f"http://127.0.0.1:{ports['gradio']}/", 60)
+
+        backend_url = f"http://127.0.0.1:{ports['backend']}"
+        if args.workers:
+            server = ["gunicorn", "main:app", "--bind", f"127.0.0.1:{ports['backend']}",
+                      "--config", os.path.join(BACKEND_DIR, "gunicorn.conf.py"), "--pythonpath", BACKEND_DIR]
+        else:
+            server = ["uvicorn", "main:app", "--port", str(ports["backend"]), "--app-dir", BACKEND_DIR]
+        # The backend runs in a scratch folder so the stand-in Spotify token doesn't
+        # overwrite the real one spotipy caches in backend/.cache
+        scratch = tempfile.mkdtemp(prefix="bench-")
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", *server, "--log-level", "warning", *args.backend_arg],
+            cwd=scratch, env=env, stdout=subprocess.DEVNULL,
+        ))
+        print(f"[Benchmark] Waiting for the backend at {backend_url} to become ready...")
+        wait_until(f"{backend_url}/ready", args.startup_timeout, process=processes[-1])
+
+        report = asyncio.run(run_load(
+            backend_url, load_commands(args.dataset), args.concurrency, args.requests, args.duration
+        ))
+        report["config"] = {
+            "intent_mode": args.intent_mode,
+            "upstream_latency_ms": args.upstream_latency_ms,
+            "upstream_error_rate": args.upstream_error_rate,
+            "workers": args.workers or 1,
+        }
+        return finish(report, args)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# backend/core/admission.py
+# Admission control for the command pipeline. A fixed number of commands run at
+# once; the rest wait in bounded queues, one per priority class, and the highest
+# class is always served first. When a queue is full (or a command has waited
+# too long) the command is shed at once instead of slowing every other one down.
+
+import asyncio
+from collections import deque
+
+from core.metrics import metrics
+
+IN_FLIGHT = metrics.gauge("assistant_admission_in_flight", "Commands currently admitted to the pipeline.")
+QUEUE_DEPTH = metrics.gauge("assistant_admission_queue_depth", "Commands waiting for admission, by priority class.")
+REJECTED = metrics.counter(
+    "assistant_admission_rejected_total", "Commands shed by admission control, by priority class and reason."
+)
+
+class Overloaded(Exception):
+    """Raised when a command is not admitted (reason: "queue_full" or "timeout")."""
+
+    def __init__(self, priority_class: str, reason: str):
+        super().__init__(f"{priority_class} queue: {reason}")
+        self.priority_class = priority_class
+        self.reason = reason
+
+class PriorityLimiter:
+    """
+    Concurrency limiter with strict priority between bounded queues.
+
+    Args:
+        max_concurrency (int): Commands admitted at once (0 admits everything).
+        queue_limits (dict): priority class -> queue length, highest priority first.
+        queue_timeout (float): Seconds a command may wait before it is shed.
+
+    A freed slot is handed straight to the oldest waiter of the highest non-empty
+    class, so a waiting command can't be overtaken by a newly arrived one.
+    Uses asyncio futures, so it must only be used from one event loop.
+    """
+
+    def __init__(self, max_concurrency: int, queue_limits: dict, queue_timeout: float = 5.0):
+        self.max_concurrency = max_concurrency
+        self.queue_limits = dict(queue_limits)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters = {priority_class: deque() for priority_class in self.queue_limits}
+        for priority_class in self.queue_limits:
+            QUEUE_DEPTH.set(0, priority_class=priority_class)
+
+    async def acquire(self, priority_class: str):
+        """
+        Waits for a slot in the command's priority class. Every acquire that returns
+        must be paired with a release().
+
+        Raises:
+            Overloaded: The class's queue is full, or no slot was granted in time.
+        """
+        if self.max_concurrency <= 0:
+            return
+        if self.in_flight < self.max_concurrency:
+            self._set_in_flight(self.in_flight + 1)
+            return
+
+        queue = self._waiters[priority_class]
+        if len(queue) >= self.queue_limits[priority_class]:
+            REJECTED.inc(priority_class=priority_class, reason="queue_full")
+            raise Overloaded(priority_class, "queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        QUEUE_DEPTH.set(len(queue), priority_class=priority_class)
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the wait ended; pass it on
+                self.release()
+            elif future in queue:
+                queue.remove(future)
+            QUEUE_DEPTH.set(len(queue), priority_class=priority_class)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            REJECTED.inc(priority_class=priority_class, reason="timeout")
+            raise Overloaded(priority_class, "timeout") from None
+
+    @property
+    def saturated(self) -> bool:
+        """True while every slot is taken, so a new command would have to queue."""
+        return 0 < self.max_concurrency <= self.in_flight
+
+    def check_capacity(self):
+        """
+        Sheds a command before any work is done for it (its intent is still
+        unknown) if it couldn't be admitted whatever its priority class: every
+        slot is taken and every queue is full.
+
+        Raises:
+            Overloaded: With priority class "any".
+        """
+        if self.saturated and all(
+            len(queue) >= self.queue_limits[priority_class] for priority_class, queue in self._waiters.items()
+        ):
+            REJECTED.inc(priority_class="any", reason="queue_full")
+            raise Overloaded("any", "queue_full")
+
+    def release(self):
+        if self.max_concurrency <= 0:
+            return
+        for priority_class, queue in self._waiters.items():
+            while queue:
+                future = queue.popleft()
+                QUEUE_DEPTH.set(len(queue), priority_class=priority_class)
+                if not future.done():
+                    # The slot moves to the waiter, so in_flight stays the same
+                    future.set_result(None)
+                    return
+        self._set_in_flight(self.in_flight - 1)
+
+    def _set_in_flight(self, value: int):
+        self.in_flight = value
+        IN_FLIGHT.set(value)
+
+    def status(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queued": {priority_class: len(queue) for priority_class, queue in self._waiters.items()},
+        }
@@ -0,0 +1,117 @@
+# backend/core/batching.py
+# Dynamic micro-batching: concurrent callers submit single items, and the batcher
+# groups whatever arrives within a short window into one call of a batch function.
+
+import asyncio
+import contextvars
+
+from core.executor import MODEL_WORKERS, run_model
+
+class MicroBatcher:
+    """
+    Collects concurrent submit() calls into batches for a blocking batch function.
+
+    A batch is dispatched as soon as it reaches max_batch_size, or max_wait_ms after
+    its first item arrived, whichever comes first. Up to max_concurrent_batches run
+    at once in the model pool; items arriving while they run form the next batch.
+
+    Args:
+        batch_fn: Blocking callable taking a list of items and returning a list of
+                  results in the same order.
+        max_batch_size (int): Largest number of items passed to batch_fn at once.
+        max_wait_ms (float): How long the first item of a batch waits for company.
+        max_concurrent_batches (int): Number of batches that may run in parallel.
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 max_concurrent_batches: int = MODEL_WORKERS, name: str = "batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.name = name
+        self._loop = None
+        self._queue = None
+        self._workers = []
+
+    def _ensure_workers(self):
+        # Workers are bound to the running event loop and started on first use.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            # Workers get a fresh context so they don't hold on to the request
+            # context (e.g. its trace) of whichever caller happened to start them
+            self._workers = [
+                loop.create_task(self._worker(), name=f"{self.name}-{i}", context=contextvars.Context())
+                for i in range(self.max_concurrent_batches)
+            ]
+
+    async def submit(self, item):
+        """Queues one item and waits for its result from the next batch."""
+        self._ensure_workers()
+        future = self._loop.create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                item = await self._get_until(timeout)
+                if item is None:
+                    break
+                batch.append(item)
+
+            # Callers that gave up (e.g. cancelled requests) don't need a forward pass
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                results = await run_model(self.batch_fn, [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def _get_until(self, timeout: float):
+        """
+        The next queued (item, future), or None if nothing arrived within `timeout`.
+
+        Unlike asyncio.wait_for(queue.get(), timeout), an item the get took just as
+        the timeout fired is returned rather than lost (possible on Python 3.11).
+        """
+        getter = asyncio.ensure_future(self._queue.get())
+        try:
+            await asyncio.wait({getter}, timeout=timeout)
+        finally:
+            if not getter.done():
+                getter.cancel()
+                await asyncio.wait({getter})
+        return None if getter.cancelled() else getter.result()
+
+    async def close(self):
+        """Stops the workers. Pending callers are cancelled."""
+        for worker in self._workers:
+            worker.cancel()
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                future.cancel()
+        self._workers = []
+        self._loop = None
+        self._queue = None
@@ -0,0 +1,174 @@
+# backend/core/cache.py
+# In-memory caches shared by the handlers: a bounded LRU with time-based expiry,
+# and an async loading wrapper that coalesces concurrent misses and refreshes
+# stale entries in the background. A loading cache can sit in front of a
+# namespace of the cross-process shared cache (core/shared_cache.py).
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from core.metrics import CACHE_REQUESTS
+from core.shared_cache import shared_cache
+
+logger = logging.getLogger(__name__)
+
+# --- 1. Bounded TTL + LRU Cache ---
+class TTLCache:
+    """
+    A thread-safe LRU cache whose entries expire.
+
+    Entries are "fresh" for `ttl` seconds after being set, then "stale" for another
+    `stale_ttl` seconds (still returned, so callers can serve them while refreshing),
+    and are dropped after that. The least recently used entry is evicted once the
+    cache holds `maxsize` entries.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0, stale_ttl: float = 0.0):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+
+    def lookup(self, key) -> tuple:
+        """
+        Returns:
+            tuple: (value, is_fresh). value is None (and is_fresh False) on a miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            value, stored_at = entry
+            age = now - stored_at
+            if age > self.ttl + self.stale_ttl:
+                del self._entries[key]
+                return None, False
+            self._entries.move_to_end(key)
+            return value, age <= self.ttl
+
+    def get(self, key):
+        """Returns the fresh value for key, or None."""
+        value, is_fresh = self.lookup(key)
+        return value if is_fresh else None
+
+    def set(self, key, value, age: float = 0.0):
+        """Stores a value. `age` backdates it, for values that were cached elsewhere first."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() - age)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# --- 2. Async Loading Cache ---
+class AsyncLoadingCache:
+    """
+    Wraps a TTLCache around an async loader function.
+
+    - Concurrent misses for the same key share a single loader call.
+    - Stale entries are returned immediately while one background call refreshes them.
+    - Loader exceptions propagate to the callers and are never cached.
+
+    - With `shared` set, misses are looked up in that shared cache namespace before
+      the loader runs, and loaded values are written to it, so other processes
+      reuse them. Shared entries keep their age, so they turn stale on schedule.
+
+    Args:
+        loader: `async def loader(key) -> value`.
+        shared (str | None): Shared cache namespace, e.g. "weather". Keys must be strings.
+    """
+
+    def __init__(self, loader, maxsize: int = 256, ttl: float = 300.0, stale_ttl: float = 0.0, name: str = "cache",
+                 shared: str | None = None):
+        self.loader = loader
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, stale_ttl=stale_ttl)
+        self.name = name
+        self.shared = shared
+        if shared:
+            shared_cache.namespace(shared, default_ttl=ttl + stale_ttl)
+        self._inflight = {}  # key -> asyncio.Task
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    async def get(self, key):
+        value, is_fresh = self.cache.lookup(key)
+        if value is not None:
+            if is_fresh:
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache=self.name, result="hit")
+            else:
+                # Stale-while-revalidate: answer now, refresh in the background
+                self.stale_hits += 1
+                CACHE_REQUESTS.inc(cache=self.name, result="stale")
+                self._load(key)
+            return value
+
+        self.misses += 1
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        # shield() keeps one caller's cancellation from cancelling the shared load
+        return await asyncio.shield(self._load(key))
+
+    def _load(self, key) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_loader(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda finished: self._on_loaded(key, finished))
+        return task
+
+    async def _run_loader(self, key):
+        if self.shared and shared_cache.enabled:
+            value, age = await shared_cache.lookup_async(self.shared, key)
+            # A stale shared entry is still worth serving, but must not stop the refresh
+            if value is not None and age <= self.cache.ttl:
+                self.cache.set(key, value, age=age)
+                return value
+        value = await self.loader(key)
+        self.cache.set(key, value)
+        if self.shared:
+            shared_cache.set(self.shared, key, value)
+        return value
+
+    # Synchronous access for code that can't await (the sync handler paths)
+    def get_cached(self, key):
+        """Returns the fresh value from memory or the shared cache, or None. Never loads."""
+        value = self.cache.get(key)
+        if value is None and self.shared:
+            value, age = shared_cache.lookup(self.shared, key)
+            if value is not None and age <= self.cache.ttl:
+                self.cache.set(key, value, age=age)
+            else:
+                value = None
+        return value
+
+    def put(self, key, value):
+        """Stores a value loaded outside the cache, in memory and the shared cache."""
+        self.cache.set(key, value)
+        if self.shared:
+            shared_cache.set(self.shared, key, value)
+
+    def _on_loaded(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Retrieve background failures so they are not reported as never retrieved
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("%s: load failed for %r: %s", self.name, key, task.exception())
+
+    def clear(self):
+        self.cache.clear()
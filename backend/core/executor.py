@@ -0,0 +1,58 @@
+# backend/core/executor.py
+# Shared worker pools that keep blocking work (model inference, sync HTTP clients)
+# off the asyncio event loop.
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 1. Pool Sizes ---
+# IO_WORKERS bounds how many blocking network calls (Gradio, Spotify) can be in flight.
+# MODEL_WORKERS bounds concurrent CPU-bound inference; torch already uses several
+# intra-op threads per call, so this should stay small.
+IO_WORKERS = int(os.getenv("IO_WORKERS", "64"))
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", "2"))
+
+# The pools are created lazily so nothing spawns threads at import time.
+_io_executor = None
+_model_executor = None
+_lock = threading.Lock()
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Returns the pool used for blocking network calls."""
+    global _io_executor
+    with _lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+        return _io_executor
+
+def get_model_executor() -> ThreadPoolExecutor:
+    """Returns the pool used for CPU-bound model inference."""
+    global _model_executor
+    with _lock:
+        if _model_executor is None:
+            _model_executor = ThreadPoolExecutor(max_workers=MODEL_WORKERS, thread_name_prefix="model")
+        return _model_executor
+
+# --- 2. Awaitable Helpers ---
+async def run_io(func, *args, **kwargs):
+    """Runs a blocking network call in the IO pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_executor(), functools.partial(func, *args, **kwargs))
+
+async def run_model(func, *args, **kwargs):
+    """Runs a CPU-bound inference call in the model pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_model_executor(), functools.partial(func, *args, **kwargs))
+
+def shutdown_executors():
+    """Stops both pools. Called when the FastAPI app shuts down."""
+    global _io_executor, _model_executor
+    with _lock:
+        for executor in (_io_executor, _model_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        _io_executor = None
+        _model_executor = None
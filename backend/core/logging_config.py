@@ -0,0 +1,51 @@
+# backend/core/logging_config.py
+# Asynchronous, level-gated logging. Records are handed to a queue on the hot path
+# and written to stderr by a background listener thread, so request handlers never
+# wait on terminal or pipe I/O.
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+# LOG_LEVEL=DEBUG shows per-request tracing; INFO (default) keeps only startup and
+# error messages, so the request path does no formatting at all.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Libraries that log every HTTP call at INFO; they only speak up at DEBUG
+CHATTY_LOGGERS = ("httpx", "httpcore", "urllib3")
+
+_listener = None
+
+def _start_listener():
+    global _listener
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+
+    logging.getLogger().handlers = [logging.handlers.QueueHandler(log_queue)]
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+def configure_logging(level: str = LOG_LEVEL):
+    """Routes the root logger through a QueueHandler. Safe to call more than once."""
+    if _listener is not None:
+        return
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    if root.getEffectiveLevel() > logging.DEBUG:
+        for name in CHATTY_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    _start_listener()
+    # Flush whatever is still queued when the process exits
+    atexit.register(_stop_listener)
+    # Forked workers (see gunicorn.conf.py) don't inherit the listener thread,
+    # so each one starts its own
+    os.register_at_fork(after_in_child=_start_listener)
@@ -0,0 +1,192 @@
+# backend/core/request_log.py
+# Append-only log of processed commands, for reproducing real traffic later
+# (see bench/replay.py). Each command becomes one JSON line with its text,
+# intent, entities, handler outcome and stage timings.
+#
+# The request path only puts the record on a queue. A background thread turns
+# records into lines and writes them in batches, and rotates the file when it
+# grows too large. When the queue is full, records are dropped (and counted),
+# so a slow disk can never hold up a request.
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- 1. Configuration ---
+# REQUEST_LOG_PATH enables the log (e.g. "logs/requests.jsonl"). With several
+# worker processes, put "{pid}" in the name so each worker writes its own file.
+REQUEST_LOG_PATH = os.getenv("REQUEST_LOG_PATH", "")
+# The file is rotated at REQUEST_LOG_MAX_MB, keeping REQUEST_LOG_BACKUPS old files
+# (requests.jsonl.1 is the newest).
+REQUEST_LOG_MAX_MB = float(os.getenv("REQUEST_LOG_MAX_MB", "64"))
+REQUEST_LOG_BACKUPS = int(os.getenv("REQUEST_LOG_BACKUPS", "5"))
+# Records are written once REQUEST_LOG_BATCH have queued up, or after
+# REQUEST_LOG_FLUSH_SECONDS, whichever comes first.
+REQUEST_LOG_BATCH = int(os.getenv("REQUEST_LOG_BATCH", "256"))
+REQUEST_LOG_FLUSH_SECONDS = float(os.getenv("REQUEST_LOG_FLUSH_SECONDS", "1"))
+REQUEST_LOG_QUEUE = int(os.getenv("REQUEST_LOG_QUEUE", "10000"))
+
+LOG_RECORDS = metrics.counter(
+    "assistant_request_log_records_total", "Request log records, by result (written, dropped)."
+)
+
+_STOP = object()
+
+# --- 2. The Log Writer ---
+class RequestLog:
+    """Batched, rotating JSON-lines writer fed through a bounded queue."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int = 5, batch_size: int = 256,
+                 flush_interval: float = 1.0, queue_size: int = 10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def write(self, record: dict):
+        """Queues a record without blocking; drops it if the writer has fallen behind."""
+        if not self.enabled:
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS.inc(result="dropped")
+
+    def _ensure_writer(self):
+        # Started on first use in each process, so preforked workers (see
+        # gunicorn.conf.py) each get a writer thread of their own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._thread = threading.Thread(target=self._run, name="request-log", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        path = self.path.replace("{pid}", str(os.getpid()))
+        file = None
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            file = open(path, "a", encoding="utf-8")
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+
+                records = [record for record in batch if record is not _STOP]
+                if records:
+                    lines = [json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in records]
+                    file.write("".join(lines))
+                    file.flush()
+                    LOG_RECORDS.inc(len(records), result="written")
+                    if self.max_bytes and file.tell() >= self.max_bytes:
+                        file.close()
+                        self._rotate(path)
+                        file = open(path, "a", encoding="utf-8")
+                if len(records) < len(batch):
+                    return
+        except Exception as e:
+            # Records queued from now on are dropped (and counted) once the queue fills up
+            logger.error("Request log writer for '%s' stopped: %s", path, e)
+        finally:
+            if file is not None:
+                file.close()
+
+    def _rotate(self, path: str):
+        """Shifts path -> path.1 -> path.2 ..., dropping the oldest."""
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{index}"):
+                os.replace(f"{path}.{index}", f"{path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+
+    def close(self, timeout: float = 5.0):
+        """Writes whatever is queued and stops the writer. Called at shutdown."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._thread, self._pid = None, None
+
+request_log = RequestLog(
+    REQUEST_LOG_PATH,
+    max_bytes=int(REQUEST_LOG_MAX_MB * 1024 * 1024),
+    backups=REQUEST_LOG_BACKUPS,
+    batch_size=REQUEST_LOG_BATCH,
+    flush_interval=REQUEST_LOG_FLUSH_SECONDS,
+    queue_size=REQUEST_LOG_QUEUE,
+)
+
+# --- 3. Per-Command Records ---
+# Each command's record lives in a context variable, so the stages that run for
+# it (entity extraction, the handler) can add fields without passing it around.
+_current_record = contextvars.ContextVar("current_record", default=None)
+
+def start_record(endpoint: str, text: str, session_id: str | None = None) -> dict | None:
+    """
+    Starts the record for a command in the current task. Returns None when logging is off.
+    The session id is kept so a replay can send follow-ups with their context.
+    """
+    if not request_log.enabled:
+        return None
+    record = {"ts": round(time.time(), 3), "endpoint": endpoint, "text": text, "_started": time.perf_counter()}
+    if session_id:
+        record["session_id"] = session_id
+    _current_record.set(record)
+    return record
+
+def annotate(**fields):
+    """Adds fields to the current command's record, if there is one."""
+    record = _current_record.get()
+    if record is not None:
+        record.update(fields)
+
+def finish_record(record: dict | None, intent: str | None, response: str, status: str = "ok", trace=None):
+    """
+    Completes a command's record and queues it for writing.
+
+    Args:
+        status (str): "ok", or "shed" when admission control turned the command away.
+        trace (Trace | None): The request's trace; its spans become the record's
+            stage timings. Batch commands share one trace, so they pass None.
+    """
+    if record is None:
+        return
+    started = record.pop("_started")
+    record.update(intent=intent, response=response, status=status)
+    record["ms"] = round((time.perf_counter() - started) * 1000, 2)
+    if trace is not None:
+        record["stages"] = {name: round(seconds * 1000, 2) for name, seconds in trace.spans.items()}
+    request_log.write(record)
@@ -0,0 +1,140 @@
+# backend/core/resilience.py
+# Guards for calls to remote services that can be slow or down: a circuit breaker
+# that stops calling a failing service for a while, a rolling latency tracker,
+# and hedged requests that send a duplicate when the first one is slow.
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+from core.metrics import metrics
+
+CIRCUIT_STATE = metrics.gauge(
+    "assistant_circuit_open", "1 while a service's circuit breaker is open or half-open, else 0."
+)
+CIRCUIT_TRIPS = metrics.counter("assistant_circuit_trips_total", "Times a circuit breaker opened, by service.")
+HEDGED_REQUESTS = metrics.counter(
+    "assistant_hedged_requests_total", "Duplicate requests sent because the first was slow, by service and winner."
+)
+
+# --- 1. Circuit Breaker ---
+class CircuitBreaker:
+    """
+    Counts consecutive failures of one remote service.
+
+    - closed: calls go through. After `failure_threshold` failures in a row it opens.
+    - open: calls are rejected for `reset_timeout` seconds, so callers fall back at once.
+    - half_open: one trial call is let through; success closes the breaker,
+      failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(0, service=name)
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls should not even be attempted (no trial is due)."""
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() - self.opened_at < self.reset_timeout
+            return self.state == "half_open"
+
+    def allow(self) -> bool:
+        """
+        Returns whether a call may go ahead. When the reset timeout has passed,
+        the first caller gets the half-open trial and the others are still rejected.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                return True
+            return False
+
+    @property
+    def in_trial(self) -> bool:
+        return self.state == "half_open"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != "closed":
+                self.state = "closed"
+                CIRCUIT_STATE.set(0, service=self.name)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                CIRCUIT_STATE.set(1, service=self.name)
+                CIRCUIT_TRIPS.inc(service=self.name)
+
+    def status(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+# --- 2. Rolling Latency Percentiles ---
+class LatencyTracker:
+    """Keeps the last `window` successful call latencies (in seconds)."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent: float, min_samples: int = 20) -> float | None:
+        """Returns the given percentile, or None until min_samples calls have been seen."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, max(0, round(percent / 100 * len(samples)) - 1))
+        return samples[index]
+
+# --- 3. Hedged Requests ---
+async def hedged(call, hedge_after: float | None, name: str = "service"):
+    """
+    Awaits `call()`. If it hasn't finished after `hedge_after` seconds, a second
+    `call()` is started and the first usable (non-None) result wins; the loser is
+    cancelled. With hedge_after=None this is a plain `await call()`.
+
+    A cancelled call that runs in a worker thread keeps running there, so calls
+    must not update shared health state (e.g. a CircuitBreaker) themselves; the
+    caller records one outcome from the returned result instead.
+    """
+    if hedge_after is None:
+        return await call()
+
+    first = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    if done:
+        return first.result()
+
+    second = asyncio.ensure_future(call())
+    pending = {first, second}
+    result = None
+    try:
+        while pending and result is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None and task.result() is not None:
+                    result = task.result()
+                    HEDGED_REQUESTS.inc(service=name, winner="hedge" if task is second else "original")
+                    break
+        return result
+    finally:
+        for task in pending:
+            task.cancel()
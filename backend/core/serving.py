@@ -0,0 +1,105 @@
+# backend/core/serving.py
+# Multi-process serving with shared model memory. The gunicorn master loads the
+# models once, then forks the workers: the weights are inherited copy-on-write,
+# so every worker can run inference on its own cores while the model pages stay
+# shared instead of being duplicated per process. Used by gunicorn.conf.py.
+
+import gc
+import logging
+import math
+import os
+
+from core.executor import shutdown_executors
+from core.startup import components
+
+logger = logging.getLogger(__name__)
+
+# --- 1. Configuration ---
+def available_cpus() -> int:
+    """
+    The cores this process may actually use. os.cpu_count() reports the host's
+    cores, so this also applies the CPU affinity mask and a container's cgroup
+    CPU quota (a 2-vCPU container on a 64-core host gets 2).
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS and Windows
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>", or "max <period>" for no limit
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: a quota of -1 means no limit
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+# Number of worker processes (gunicorn's standard variable). One by default:
+# every worker has its own IO pool, Space client and session memory (see
+# nlp/session_context.py), so more workers are opted into explicitly, e.g.
+# WEB_CONCURRENCY=4 on a 4-core machine.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+# Torch intra-op threads per worker. By default the available cores are split
+# between the workers, so N workers x T threads don't oversubscribe the machine.
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0")) or max(1, available_cpus() // WEB_CONCURRENCY)
+
+# Components that are safe to load before forking. Remote clients (the Gradio
+# Space) hold sockets and threads, so every worker connects on its own.
+PRELOADED_COMPONENTS = ("ner", "emotion")
+
+# --- 2. Helpers ---
+def set_torch_threads(count: int):
+    """Sets torch's intra-op thread count, if torch is installed."""
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(count)
+
+def preload_models(skip: set | None = None):
+    """
+    Loads the entity models in the current (parent) process before it forks.
+
+    Torch runs single-threaded here, so no inference thread pool exists at fork
+    time (a pool inherited by a forked child can deadlock). The loader threads and
+    worker pools are shut down afterwards for the same reason, and gc.freeze()
+    moves everything loaded so far out of the collector's reach, so collections
+    in the workers don't write to (and un-share) those pages.
+    """
+    from nlp.entity_extractor import ENTITY_BACKEND
+
+    if ENTITY_BACKEND == "onnx":
+        # ONNX Runtime creates its thread pools with each session, and they don't survive a fork
+        logger.warning("ENTITY_BACKEND=onnx can't be shared across workers; each worker loads its own models.")
+        return
+
+    set_torch_threads(1)
+    for name in PRELOADED_COMPONENTS:
+        if name not in (skip or set()):
+            components.ensure_sync(name)
+    components.shutdown()
+    shutdown_executors()
+    gc.freeze()
+    logger.info("Preloaded %s for %d workers.", ", ".join(PRELOADED_COMPONENTS), WEB_CONCURRENCY)
+
+def init_worker():
+    """Runs in each worker right after the fork, before it serves requests."""
+    from nlp.entity_extractor import warm_up_models
+
+    set_torch_threads(TORCH_THREADS)
+    warm_up_models()
+    logger.info("Worker %d ready (%d torch threads).", os.getpid(), TORCH_THREADS)
@@ -0,0 +1,282 @@
+# backend/core/shared_cache.py
+# Second-level cache shared by every backend process, behind the per-process
+# caches (nlp/command_cache.py, and the weather and Spotify AsyncLoadingCaches).
+# When one replica has asked the Space, OpenWeatherMap or Spotify, the others
+# find the answer here instead of asking again.
+#
+# Stores (SHARED_CACHE):
+#   sqlite - a WAL-mode SQLite file that all processes on the node open. By default
+#            it lives in /dev/shm, so reads are served from memory-mapped pages.
+#   redis  - a Redis server shared across nodes (needs `pip install redis`).
+#   memory - an in-process dict with the same interface, a local stand-in for a
+#            networked store (tests, benchmarks, single-process runs).
+#
+# Entries are compact JSON, zlib-compressed when large, and expire after their
+# namespace's TTL. The cache is only an optimization. A failing store is skipped
+# by a circuit breaker and treated as a miss, so it never fails a request.
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+
+from core.executor import get_io_executor, run_io
+from core.metrics import CACHE_REQUESTS, metrics
+from core.resilience import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# --- 1. Configuration ---
+# Empty (the default) turns the shared cache off.
+SHARED_CACHE = os.getenv("SHARED_CACHE", "").lower()
+_DEFAULT_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", os.path.join(_DEFAULT_DIR, "car-assistant-cache.sqlite3"))
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "redis://localhost:6379/0")
+# Longest a Redis read or write may take before it counts as a failure.
+SHARED_CACHE_TIMEOUT = float(os.getenv("SHARED_CACHE_TIMEOUT", "0.05"))
+# Per-namespace TTLs in seconds, e.g. "weather=300,spotify=3600". Namespaces not
+# listed use the default their cache registers (see SharedCache.namespace).
+SHARED_CACHE_TTLS = {
+    name.strip(): float(ttl)
+    for name, _, ttl in (item.partition("=") for item in os.getenv("SHARED_CACHE_TTLS", "").split(","))
+    if name.strip() and ttl.strip()
+}
+
+# Values larger than this many bytes of JSON are zlib-compressed
+COMPRESS_MIN_BYTES = 512
+
+SHARED_CACHE_SECONDS = metrics.histogram(
+    "assistant_shared_cache_duration_seconds", "Shared cache store latency, by operation (get, set)."
+)
+
+# --- 2. Serialization ---
+def encode(value, stored_at: float) -> bytes:
+    payload = json.dumps([stored_at, value], separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(payload, 1)
+    return b"j" + payload
+
+def decode(data: bytes) -> tuple:
+    """
+    Returns:
+        tuple: (value, stored_at) as written by encode().
+    """
+    payload = zlib.decompress(data[1:]) if data[:1] == b"z" else data[1:]
+    stored_at, value = json.loads(payload)
+    return value, stored_at
+
+# --- 3. Stores ---
+# Each store keeps opaque bytes under a string key with a TTL: get(key) -> bytes | None,
+# set_many([(key, data, ttl), ...]).
+class SQLiteStore:
+    """A SQLite file opened by every process; one connection per thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        # Connections must not cross a fork (see gunicorn.conf.py)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA mmap_size=268435456")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)"
+            )
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, key: str) -> bytes | None:
+        row = self._connection().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_many(self, items: list):
+        now = time.time()
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                [(key, data, now + ttl) for key, data, ttl in items],
+            )
+            # Expired rows are only skipped by get(), so sweep them now and then
+            self._writes += len(items)
+            if self._writes >= 1000:
+                self._writes = 0
+                connection.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+
+class MemoryStore:
+    """In-process stand-in for a networked store."""
+
+    def __init__(self):
+        self._entries = {}  # key -> (data, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            return entry[0]
+
+    def set_many(self, items: list):
+        now = time.time()
+        with self._lock:
+            for key, data, ttl in items:
+                self._entries[key] = (data, now + ttl)
+
+class RedisStore:
+    """A Redis server, for replicas on different nodes."""
+
+    def __init__(self, url: str, timeout: float):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    def get(self, key: str) -> bytes | None:
+        return self._client.get(key)
+
+    def set_many(self, items: list):
+        pipeline = self._client.pipeline(transaction=False)
+        for key, data, ttl in items:
+            pipeline.set(key, data, px=int(ttl * 1000))
+        pipeline.execute()
+
+def _open_store(kind: str):
+    if kind == "sqlite":
+        return SQLiteStore(SHARED_CACHE_PATH)
+    if kind == "redis":
+        return RedisStore(SHARED_CACHE_URL, SHARED_CACHE_TIMEOUT)
+    if kind == "memory":
+        return MemoryStore()
+    raise ValueError(f"Unknown SHARED_CACHE '{kind}' (expected sqlite, redis or memory).")
+
+# --- 4. The Shared Cache ---
+class SharedCache:
+    """
+    Namespaced, TTL-bounded access to the shared store.
+
+    lookup() is synchronous (a local SQLite read takes microseconds; a Redis read
+    is bounded by SHARED_CACHE_TIMEOUT); code on the event loop uses lookup_async()
+    so a slow store never blocks it. Writes are queued and sent in batches from the
+    IO pool, so callers never wait on them.
+    """
+
+    def __init__(self, kind: str = ""):
+        self.kind = kind
+        self._store = None
+        self._store_lock = threading.Lock()
+        self._ttls = {}
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.breaker = CircuitBreaker("shared_cache", failure_threshold=3, reset_timeout=30.0)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.kind)
+
+    def namespace(self, name: str, default_ttl: float):
+        """Declares a namespace and its TTL; SHARED_CACHE_TTLS overrides the default."""
+        self._ttls[name] = SHARED_CACHE_TTLS.get(name, default_ttl)
+
+    def _get_store(self):
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    self._store = _open_store(self.kind)
+        return self._store
+
+    def _call(self, operation: str, func, *args):
+        """Runs a store call behind the circuit breaker. Returns None if it failed or was skipped."""
+        if not self.breaker.allow():
+            return None
+        start = time.perf_counter()
+        try:
+            result = func(self._get_store(), *args)
+        except Exception as e:
+            self.breaker.record_failure()
+            logger.warning("Shared cache %s failed: %s", operation, e)
+            return None
+        SHARED_CACHE_SECONDS.observe(time.perf_counter() - start, operation=operation)
+        self.breaker.record_success()
+        return result
+
+    def lookup(self, namespace: str, key: str) -> tuple:
+        """
+        Returns:
+            tuple: (value, age in seconds). value is None on a miss.
+        """
+        if not self.enabled or namespace not in self._ttls:
+            return None, 0.0
+        data = self._call("get", lambda store: store.get(f"{namespace}\x1f{key}"))
+        if data is None:
+            CACHE_REQUESTS.inc(cache=f"Shared Cache ({namespace})", result="miss")
+            return None, 0.0
+        value, stored_at = decode(data)
+        CACHE_REQUESTS.inc(cache=f"Shared Cache ({namespace})", result="hit")
+        return value, max(0.0, time.time() - stored_at)
+
+    def get(self, namespace: str, key: str):
+        """Returns the shared value, or None."""
+        return self.lookup(namespace, key)[0]
+
+    async def lookup_async(self, namespace: str, key: str) -> tuple:
+        """lookup() run in the IO pool, for callers on the event loop."""
+        if not self.enabled or namespace not in self._ttls:
+            return None, 0.0
+        return await run_io(self.lookup, namespace, key)
+
+    def set(self, namespace: str, key: str, value):
+        """Queues a value for the shared store without waiting for the write."""
+        ttl = self._ttls.get(namespace, 0.0)
+        if not self.enabled or value is None or ttl <= 0:
+            return
+        item = (f"{namespace}\x1f{key}", encode(value, time.time()), ttl)
+        with self._pending_lock:
+            self._pending.append(item)
+            should_flush = len(self._pending) == 1
+        if should_flush:
+            get_io_executor().submit(self.flush)
+
+    def flush(self):
+        """Writes the queued values in one batch, after any write already under way."""
+        with self._flush_lock:
+            with self._pending_lock:
+                items, self._pending = self._pending, []
+            if items:
+                self._call("set", lambda store: store.set_many(items))
+
+    def status(self) -> dict:
+        return {"store": self.kind or "off", "circuit": self.breaker.state}
+
+shared_cache = SharedCache(SHARED_CACHE)
+
+# --- Testing Block ---
+# To run it, open a terminal in your `backend` folder and type:
+# SHARED_CACHE=sqlite python -m core.shared_cache
+if __name__ == "__main__":
+    from core.logging_config import configure_logging
+
+    configure_logging("DEBUG")
+    cache = SharedCache(SHARED_CACHE or "memory")
+    cache.namespace("demo", default_ttl=60)
+    cache.set("demo", "new delhi", {"weather": [{"description": "haze"}], "main": {"temp": 31}})
+    cache.flush()
+    print(f"Store: {cache.kind}")
+    print(f"Lookup 'new delhi': {cache.lookup('demo', 'new delhi')}")
+    print(f"Lookup 'mumbai': {cache.lookup('demo', 'mumbai')}")
+    print(f"Encoded size of a large value: {len(encode(['top hits'] * 200, time.time()))} bytes")
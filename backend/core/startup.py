@@ -0,0 +1,136 @@
+# backend/core/startup.py
+# Tracks the slow-to-load parts of the backend (models, remote clients) so they can
+# be loaded in parallel in the background, awaited lazily, and reported by /ready.
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class Component:
+    """One loadable dependency and its loading state."""
+
+    def __init__(self, name: str, loader, required: bool):
+        self.name = name
+        self.loader = loader
+        self.required = required
+        self.state = "pending"  # pending -> loading -> ready | failed
+        self.error = None
+        self.load_seconds = None
+        self.future = None
+
+class ComponentRegistry:
+    """
+    Registry of named loader functions.
+
+    Modules register their loaders at import time (which is cheap); the app then
+    calls start() to run them all in parallel background threads. Code that needs
+    a component calls ensure() / ensure_sync(), which returns immediately once it
+    is loaded and otherwise waits for (or starts) its load.
+    """
+
+    def __init__(self):
+        self._components = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._started = False
+
+    def register(self, name: str, loader, required: bool = True):
+        """
+        Args:
+            name (str): Component name shown by /ready.
+            loader: Blocking function that loads the component; it should raise on failure.
+            required (bool): Whether the app is not ready until this component has loaded.
+        """
+        self._components[name] = Component(name, loader, required)
+
+    def _run(self, component: Component):
+        component.state = "loading"
+        start = time.perf_counter()
+        try:
+            component.loader()
+            component.state = "ready"
+            component.error = None
+        except Exception as e:
+            component.state = "failed"
+            component.error = str(e)
+            logger.error("Failed to load '%s': %s", component.name, e)
+        component.load_seconds = round(time.perf_counter() - start, 3)
+
+    def _start(self, name: str) -> Future:
+        with self._lock:
+            component = self._components[name]
+            if component.future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=max(1, len(self._components)), thread_name_prefix="startup"
+                    )
+                component.future = self._executor.submit(self._run, component)
+            return component.future
+
+    def start(self, skip: set | None = None):
+        """Starts loading every component except the deferred ones in `skip`."""
+        self._started = True
+        for name in self._components:
+            if name not in (skip or set()):
+                self._start(name)
+
+    def ensure_sync(self, name: str):
+        """Blocks until the component has finished loading (successfully or not)."""
+        if name in self._components and self._components[name].state not in ("ready", "failed"):
+            self._start(name).result()
+
+    async def ensure(self, name: str):
+        """Awaits the component without blocking the event loop."""
+        if name in self._components and self._components[name].state not in ("ready", "failed"):
+            await asyncio.wrap_future(self._start(name))
+
+    def reload(self, name: str) -> bool:
+        """
+        Runs a component's loader again in the calling thread (e.g. to reconnect a
+        remote client after failures) and returns whether it succeeded.
+        """
+        component = self._components[name]
+        with self._lock:
+            if component.future is None:
+                # Mark it as started so /ready reports the outcome
+                component.future = Future()
+                component.future.set_result(None)
+        self._run(component)
+        return component.state == "ready"
+
+    def state(self, name: str) -> str | None:
+        """The component's loading state, or None if no such component is registered."""
+        component = self._components.get(name)
+        return component.state if component else None
+
+    def is_ready(self) -> bool:
+        """True once every required component that was started has loaded."""
+        return self._started and all(
+            component.state == "ready"
+            for component in self._components.values()
+            if component.required and component.future is not None
+        )
+
+    def status(self) -> dict:
+        return {
+            name: {
+                "state": "deferred" if component.future is None else component.state,
+                "required": component.required,
+                "load_seconds": component.load_seconds,
+                **({"error": component.error} if component.error else {}),
+            }
+            for name, component in self._components.items()
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+# The registry shared by the whole backend
+components = ComponentRegistry()
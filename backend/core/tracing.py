@@ -0,0 +1,56 @@
+# backend/core/tracing.py
+# Lightweight per-request timing spans. Each request gets a Trace in a context
+# variable; pipeline stages wrap their work in span(...), the totals are reported
+# in the standard Server-Timing response header, and every span is also recorded
+# in the assistant_stage_duration_seconds histogram served by /metrics.
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+from core.metrics import STAGE_SECONDS
+
+class Trace:
+    """Accumulated stage durations (in seconds) for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}
+
+    def add(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        """Formats the spans as a Server-Timing header value (durations in ms)."""
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.spans.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+def start_trace() -> Trace:
+    """Starts a new trace for the current request (and the tasks it spawns)."""
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+@contextmanager
+def span(name: str):
+    """Times the enclosed block, records it in STAGE_SECONDS and adds it to the current request's trace."""
+    trace = _current_trace.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        if trace is not None:
+            trace.add(name, elapsed)
+
+async def timed(name: str, func, *args):
+    """Awaits `func(*args)` inside span(name)."""
+    with span(name):
+        return await func(*args)
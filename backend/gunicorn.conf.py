@@ -0,0 +1,34 @@
+# backend/gunicorn.conf.py
+# Multi-process serving: `gunicorn main:app` (run from the backend folder) picks
+# this file up automatically. The master imports the app and loads the models
+# once, then forks WEB_CONCURRENCY uvicorn workers that share the model memory
+# copy-on-write (see core/serving.py).
+
+import os
+import sys
+
+# The config is loaded before the app, possibly from another working directory
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.serving import TORCH_THREADS, WEB_CONCURRENCY, init_worker, preload_models
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = WEB_CONCURRENCY
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Import main.py in the master, so the workers are forked from a loaded app
+preload_app = True
+
+# Model loading happens in the master, so workers start quickly
+timeout = 120
+graceful_timeout = 30
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any worker is forked
+    from main import deferred_components
+
+    server.log.info(f"Loading models before forking {WEB_CONCURRENCY} workers ({TORCH_THREADS} torch threads each)")
+    preload_models(skip=deferred_components())
+
+def post_worker_init(worker):
+    init_worker()
@@ -0,0 +1,232 @@
+# backend/handlers/registry.py
+# Maps each intent to its handler. Handlers are declared by module path and only
+# imported the first time their intent is used, so the external clients they set
+# up (Spotify, OpenWeatherMap) cost nothing at startup, and a handler that fails
+# to load (e.g. missing API keys) only turns its own intent off.
+#
+# Every handler is an async function `handler(text, entities) -> str` and runs
+# under its own budget: a timeout, a concurrency limit and an optional response
+# cache, so one slow upstream service can't tie up the whole pipeline.
+
+import asyncio
+import importlib
+import logging
+import os
+
+from core.cache import TTLCache
+from core.executor import run_io
+from core.metrics import metrics
+from core.request_log import annotate
+
+logger = logging.getLogger(__name__)
+
+HANDLER_RESULTS = metrics.counter(
+    "assistant_handler_results_total",
+    "Handler outcomes by intent (ok, cached, missing_entity, busy, timeout, error, unavailable).",
+)
+
+UNKNOWN_INTENT_RESPONSE = "I'm not sure how to handle that intent yet."
+UNAVAILABLE_RESPONSE = "Sorry, that feature isn't available right now."
+BUSY_RESPONSE = "Sorry, I'm still working on a few of those. Please try again in a moment."
+TIMEOUT_RESPONSE = "Sorry, that's taking too long. Please try again."
+ERROR_RESPONSE = "Sorry, something went wrong while handling that."
+
+# --- 1. Handler Specs ---
+class HandlerSpec:
+    """One intent's handler and its resource budget."""
+
+    def __init__(self, intent: str, target: str, required_entities: dict | None = None,
+                 timeout: float = 5.0, max_concurrency: int = 32, cache_ttl: float = 0.0,
+                 cache_size: int = 256, warm_up: str | None = None, close: str | None = None):
+        """
+        Args:
+            intent (str): The intent this handler answers.
+            target (str): "module:function" of the async handler, imported on first use.
+            required_entities (dict): entity field -> question asked when it's missing;
+                the handler isn't called until every field has a value.
+            timeout (float): Seconds before the user gets TIMEOUT_RESPONSE instead.
+            max_concurrency (int): Calls in flight at once; further interactive calls get
+                BUSY_RESPONSE right away, so a stalled upstream service can't hold every
+                request. Batch calls wait for a slot instead (see HandlerRegistry.run).
+            cache_ttl (float): Seconds to reuse a response for the same text and entities
+                (0 disables). Only for handlers without side effects.
+            warm_up (str | None): Optional async function in the module, run by warm_up().
+            close (str | None): Optional async function in the module, run by close().
+        """
+        self.intent = intent
+        self.module_name, self.function_name = target.split(":")
+        self.required_entities = required_entities or {}
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl) if cache_ttl > 0 else None
+        self.warm_up_name = warm_up
+        self.close_name = close
+        self.module = None
+        self.function = None
+        self.error = None
+        self._load_lock = asyncio.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.function is not None:
+            return "ready"
+        return "failed" if self.error else "not_loaded"
+
+# --- 2. The Registry ---
+class HandlerRegistry:
+    """Intent -> HandlerSpec. Use run() to answer a command."""
+
+    def __init__(self):
+        self._specs = {}
+
+    def register(self, intent: str, target: str, **budget) -> HandlerSpec:
+        """Registers (or replaces) the handler for an intent. See HandlerSpec for the options."""
+        spec = HandlerSpec(intent, target, **budget)
+        self._specs[intent] = spec
+        return spec
+
+    def intents(self) -> list:
+        return list(self._specs)
+
+    async def _load(self, spec: HandlerSpec):
+        """Imports the handler's module once. A failed import is not retried."""
+        async with spec._load_lock:
+            if spec.function is not None or spec.error:
+                return
+            try:
+                # Imports can be slow (client setup), so they run off the event loop
+                spec.module = await run_io(importlib.import_module, spec.module_name)
+                spec.function = getattr(spec.module, spec.function_name)
+                logger.info("Loaded handler for '%s' from %s.", spec.intent, spec.module_name)
+            except Exception as e:
+                spec.error = str(e) or type(e).__name__
+                logger.error("Handler for '%s' is unavailable: %s", spec.intent, e)
+
+    @staticmethod
+    def _outcome(intent: str, result: str):
+        HANDLER_RESULTS.inc(intent=intent, result=result)
+        annotate(handler=result)
+
+    async def run(self, intent: str, text: str, entities: dict, wait: bool = False) -> str:
+        """
+        Answers a command with the handler for its intent, within the handler's budget.
+
+        Args:
+            wait (bool): Queue for a free slot (for at most the handler's timeout)
+                instead of answering BUSY_RESPONSE at once. Batches set this: their
+                commands arrive together and would otherwise mostly be turned away.
+        """
+        spec = self._specs.get(intent)
+        if spec is None:
+            return UNKNOWN_INTENT_RESPONSE
+
+        for field, question in spec.required_entities.items():
+            if not entities.get(field):
+                self._outcome(intent, "missing_entity")
+                return question
+
+        cache_key = (text, tuple(sorted(entities.items())))
+        if spec.cache is not None:
+            cached = spec.cache.get(cache_key)
+            if cached is not None:
+                self._outcome(intent, "cached")
+                return cached
+
+        if not await self._acquire(spec, wait):
+            self._outcome(intent, "busy")
+            return BUSY_RESPONSE
+
+        try:
+            await self._load(spec)
+            if spec.function is None:
+                self._outcome(intent, "unavailable")
+                return UNAVAILABLE_RESPONSE
+            try:
+                response = await asyncio.wait_for(spec.function(text, entities), spec.timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Handler for '%s' timed out after %.1fs", intent, spec.timeout)
+                self._outcome(intent, "timeout")
+                return TIMEOUT_RESPONSE
+            except Exception as e:
+                logger.exception("Handler for '%s' failed: %s", intent, e)
+                self._outcome(intent, "error")
+                return ERROR_RESPONSE
+        finally:
+            spec.semaphore.release()
+
+        self._outcome(intent, "ok")
+        if spec.cache is not None:
+            spec.cache.set(cache_key, response)
+        return response
+
+    @staticmethod
+    async def _acquire(spec: HandlerSpec, wait: bool) -> bool:
+        """Takes one of the handler's slots. Returns False if none is free (in time)."""
+        if not wait:
+            # Fail fast instead of queueing behind calls that are already slow
+            if spec.semaphore.locked():
+                return False
+            await spec.semaphore.acquire()
+            return True
+        try:
+            await asyncio.wait_for(spec.semaphore.acquire(), spec.timeout)
+        except asyncio.TimeoutError:
+            logger.warning("No free '%s' handler slot within %.1fs", spec.intent, spec.timeout)
+            return False
+        return True
+
+    async def warm_up(self, intent: str):
+        """Loads an intent's handler and runs its warm-up function, if it has one."""
+        spec = self._specs.get(intent)
+        if spec is None:
+            return
+        await self._load(spec)
+        if spec.module is not None and spec.warm_up_name:
+            await getattr(spec.module, spec.warm_up_name)()
+
+    async def close(self):
+        """Runs the close functions of the handlers that were loaded. Called at shutdown."""
+        for spec in self._specs.values():
+            if spec.module is not None and spec.close_name:
+                await getattr(spec.module, spec.close_name)()
+
+    def status(self) -> dict:
+        return {
+            intent: {"state": spec.state, "error": spec.error}
+            for intent, spec in self._specs.items()
+        }
+
+handler_registry = HandlerRegistry()
+
+# --- 3. Built-in Intents ---
+# The weather and Spotify handlers cache their upstream lookups themselves (and
+# never cache failures), so they don't use a response cache here. Playing music
+# opens a browser, so its responses must never be replayed from a cache.
+HANDLER_TIMEOUT = float(os.getenv("HANDLER_TIMEOUT", "8"))
+
+handler_registry.register(
+    "navigate", "handlers.vehicle_handler:handle_navigation",
+    required_entities={"location": "Where would you like to navigate to?"},
+    timeout=1.0,
+)
+handler_registry.register(
+    "adjust_temperature", "handlers.vehicle_handler:handle_temperature_change",
+    timeout=1.0,
+)
+handler_registry.register(
+    "call_person", "handlers.vehicle_handler:handle_calling",
+    required_entities={"contact_name": "Who would you like me to call?"},
+    timeout=1.0,
+)
+handler_registry.register(
+    "get_weather", "handlers.weather_handler:handle_weather",
+    timeout=HANDLER_TIMEOUT,
+    max_concurrency=int(os.getenv("WEATHER_MAX_CONCURRENCY", "32")),
+    close="close_http_client",
+)
+handler_registry.register(
+    "play_music", "handlers.spotify_handler:handle_play_music",
+    timeout=HANDLER_TIMEOUT,
+    max_concurrency=int(os.getenv("SPOTIFY_MAX_CONCURRENCY", "16")),
+    warm_up="warm_up_playlist_cache",
+)
@@ -1,13 +1,21 @@
 # backend/handlers/spotify_handler.py
 
+import logging
 import os
 from dotenv import load_dotenv
+import asyncio
 import spotipy
+from requests.adapters import HTTPAdapter
 from spotipy.oauth2 import SpotifyClientCredentials
 import webbrowser
 
+from core.cache import AsyncLoadingCache
+from core.executor import IO_WORKERS, run_io
+from core.metrics import UPSTREAM_ERRORS
+
 # --- 1. Load Environment Variables ---
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 # --- 2. Initialize the Spotify Client ---
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
@@ -22,10 +30,24 @@ try:
     client_credentials_manager = SpotifyClientCredentials(
         client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET
     )
-    sp_client = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
-    print("[Spotify Handler] Spotify client initialized successfully.")
+    sp_client = spotipy.Spotify(
+        client_credentials_manager=client_credentials_manager,
+        requests_timeout=float(os.getenv("SPOTIFY_TIMEOUT", "5")),
+    )
+    # Optional overrides to run against a stand-in server (see bench/fake_services.py)
+    if os.getenv("SPOTIFY_TOKEN_URL"):
+        client_credentials_manager.OAUTH_TOKEN_URL = os.getenv("SPOTIFY_TOKEN_URL")
+    if os.getenv("SPOTIFY_API_PREFIX"):
+        sp_client.prefix = os.getenv("SPOTIFY_API_PREFIX")
+    # One client (and its token) is shared by every IO worker thread. Widen its
+    # keep-alive pool to match so concurrent searches don't discard connections.
+    for prefix, adapter in list(sp_client._session.adapters.items()):
+        sp_client._session.mount(
+            prefix, HTTPAdapter(max_retries=adapter.max_retries, pool_connections=4, pool_maxsize=IO_WORKERS)
+        )
+    logger.info("Spotify client initialized successfully.")
 except Exception as e:
-    print(f"[Spotify Handler] Error initializing Spotify client: {e}")
+    logger.error("Error initializing Spotify client: %s", e)
     sp_client = None
 
 # --- 3. Define Helper Data ---
@@ -39,76 +61,169 @@ MOOD_TO_GENRE_MAP = {
     'neutral': ['top hits', 'trending', 'pop'],
 }
 
-# --- 4. The Main Handler Function ---
-def play_music_based_on_entities(entities: dict):
+# --- 4. Search Result Cache ---
+# The query space is small (moods, languages and popular artists), so playlist
+# search results are cached. Entries are fresh for SPOTIFY_CACHE_TTL seconds and
+# then served stale for up to SPOTIFY_CACHE_STALE_TTL more while they refresh.
+SPOTIFY_CACHE_TTL = float(os.getenv("SPOTIFY_CACHE_TTL", "21600"))
+SPOTIFY_CACHE_STALE_TTL = float(os.getenv("SPOTIFY_CACHE_STALE_TTL", "86400"))
+SPOTIFY_CACHE_SIZE = int(os.getenv("SPOTIFY_CACHE_SIZE", "1024"))
+
+# Comma-separated artists whose searches are cached at startup, e.g. "Arijit Singh,Diljit Dosanjh"
+SPOTIFY_WARMUP_ARTISTS = [a.strip() for a in os.getenv("SPOTIFY_WARMUP_ARTISTS", "").split(",") if a.strip()]
+
+def _search_playlist(search_query: str) -> dict:
     """
-    Builds a search query from entities, finds a playlist on Spotify,
-    and opens it in a web browser.
+    Searches Spotify for the top playlist matching the query.
 
-    Args:
-        entities (dict): A dictionary of extracted entities from the NLP module.
+    Returns:
+        dict: {'name', 'url'} of the playlist, or an empty dict if nothing matched.
+              Raises on API errors so failures are never cached.
     """
+    results = sp_client.search(q=search_query, type='playlist', limit=1)
+
+    # --- FIX: Added a more robust check for the results object ---
+    # First, check if results is not None, then check if it contains items.
+    if results and results.get('playlists') and results['playlists'].get('items'):
+        playlist = results['playlists']['items'][0]
+        return {"name": playlist['name'], "url": playlist['external_urls']['spotify']}
+    return {}
+
+async def _load_playlist(search_query: str) -> dict:
+    return await run_io(_search_playlist, search_query)
+
+playlist_cache = AsyncLoadingCache(
+    _load_playlist,
+    maxsize=SPOTIFY_CACHE_SIZE,
+    ttl=SPOTIFY_CACHE_TTL,
+    stale_ttl=SPOTIFY_CACHE_STALE_TTL,
+    name="Spotify Cache",
+    shared="spotify",
+)
+
+def warm_up_queries() -> list:
+    """Every search query the common mood, language and artist paths can produce."""
+    from nlp.entity_extractor import SUPPORTED_LANGUAGES
+
+    queries = {build_search_query({"mood": mood}) for mood in MOOD_TO_GENRE_MAP}
+    queries.update(build_search_query({"language": language}) for language in SUPPORTED_LANGUAGES)
+    queries.update(build_search_query({"artist": artist}) for artist in SPOTIFY_WARMUP_ARTISTS)
+    queries.add(build_search_query({"mood": "unknown"}))
+    queries.add(build_search_query({}))
+    return sorted(queries)
+
+async def warm_up_playlist_cache(concurrency: int = 4):
+    """Fills the playlist cache at startup so common requests never wait on Spotify."""
     if not sp_client:
-        print("  [Spotify Handler] Spotify client is not available. Cannot play music.")
-        return "Sorry, I can't connect to Spotify right now."
-
-    # --- Build the Search Query ---
+        return
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def warm(query):
+        async with semaphore:
+            try:
+                await playlist_cache.get(query)
+            except Exception as e:
+                logger.warning("Warm-up search failed for '%s': %s", query, e)
+
+    queries = warm_up_queries()
+    await asyncio.gather(*(warm(query) for query in queries))
+    logger.info("Warmed playlist cache with %d queries.", len(queries))
+
+# --- 5. The Main Handler Functions ---
+def build_search_query(entities: dict) -> str:
+    """Builds the Spotify search query for the extracted entities."""
     # We prioritize the search in a specific order: Artist > Language > Mood
     query_parts = []
-    
+
     if entities.get("artist"):
         query_parts.append(entities["artist"])
-        print(f"  [Spotify Handler] Prioritizing search for artist: {entities['artist']}")
-    
+
     if entities.get("language"):
         query_parts.append(entities["language"])
-        print(f"  [Spotify Handler] Adding language to search: {entities['language']}")
 
     # If no artist or language was found, fall back to mood
     if not query_parts and entities.get("mood"):
-        mood = entities["mood"]
         # Get a list of search terms for the mood, or default to 'pop'
-        genre_terms = MOOD_TO_GENRE_MAP.get(mood, ['pop'])
-        query_parts.extend(genre_terms)
-        print(f"  [Spotify Handler] No artist/language found. Searching by mood: {mood} (using terms: {genre_terms})")
+        query_parts.extend(MOOD_TO_GENRE_MAP.get(entities["mood"], ['pop']))
 
     # If there are still no query parts, default to a generic search
     if not query_parts:
-        print("  [Spotify Handler] No specific entities found. Defaulting to 'top hits'.")
         query_parts.append("top hits")
 
     # Join the parts to create the final search query
-    search_query = " ".join(query_parts)
-    print(f"  [Spotify Handler] Final Spotify search query: '{search_query}'")
+    return " ".join(query_parts)
+
+def _play_playlist(playlist: dict, search_query: str) -> str:
+    if not playlist:
+        logger.debug("No playlists found for query: '%s'", search_query)
+        return f"Sorry, I couldn't find any playlists for '{search_query}'."
+
+    logger.debug("Found playlist: '%s', opening URL: %s", playlist['name'], playlist['url'])
+
+    # Open the playlist URL in the default web browser
+    webbrowser.open(playlist['url'])
+
+    return f"Playing '{playlist['name']}' on Spotify for you."
+
+def play_music_based_on_entities(entities: dict):
+    """
+    Builds a search query from entities, finds a playlist on Spotify,
+    and opens it in a web browser.
+
+    Args:
+        entities (dict): A dictionary of extracted entities from the NLP module.
+    """
+    if not sp_client:
+        logger.warning("Spotify client is not available. Cannot play music.")
+        return "Sorry, I can't connect to Spotify right now."
+
+    search_query = build_search_query(entities)
+    logger.debug("Final Spotify search query: '%s'", search_query)
 
     # --- Search Spotify and Open Playlist ---
     try:
-        results = sp_client.search(q=search_query, type='playlist', limit=1)
-        
-        # --- FIX: Added a more robust check for the results object ---
-        # First, check if results is not None, then check if it contains items.
-        if results and results.get('playlists') and results['playlists'].get('items'):
-            playlist = results['playlists']['items'][0]
-            playlist_name = playlist['name']
-            playlist_url = playlist['external_urls']['spotify']
-            
-            print(f"  [Spotify Handler] Found playlist: '{playlist_name}'")
-            print(f"  [Spotify Handler] Opening URL: {playlist_url}")
-            
-            # Open the playlist URL in the default web browser
-            webbrowser.open(playlist_url)
-            
-            return f"Playing '{playlist_name}' on Spotify for you."
-        else:
-            print(f"  [Spotify Handler] No playlists found for query: '{search_query}'")
-            return f"Sorry, I couldn't find any playlists for '{search_query}'."
+        playlist = playlist_cache.get_cached(search_query)
+        if playlist is None:
+            playlist = _search_playlist(search_query)
+            playlist_cache.put(search_query, playlist)
+        return _play_playlist(playlist, search_query)
+
+    except Exception as e:
+        logger.warning("An error occurred during Spotify search: %s", e)
+        UPSTREAM_ERRORS.inc(service="spotify")
+        return "Sorry, an error occurred while searching on Spotify."
+
+async def play_music_based_on_entities_async(entities: dict):
+    """
+    Awaitable version of play_music_based_on_entities. Searches go through
+    playlist_cache, so repeated queries are answered from memory and identical
+    in-flight searches share one spotipy call in the IO pool.
+    """
+    if not sp_client:
+        logger.warning("Spotify client is not available. Cannot play music.")
+        return "Sorry, I can't connect to Spotify right now."
+
+    search_query = build_search_query(entities)
+    logger.debug("Final Spotify search query: '%s'", search_query)
+
+    try:
+        playlist = await playlist_cache.get(search_query)
+        # webbrowser.open can block, so it runs in the IO pool as well
+        return await run_io(_play_playlist, playlist, search_query)
 
     except Exception as e:
-        print(f"  [Spotify Handler] An error occurred during Spotify search: {e}")
+        logger.warning("An error occurred during Spotify search: %s", e)
+        UPSTREAM_ERRORS.inc(service="spotify")
         return "Sorry, an error occurred while searching on Spotify."
 
+async def handle_play_music(text: str, entities: dict) -> str:
+    """Entry point for the play_music intent (see handlers/registry.py)."""
+    return await play_music_based_on_entities_async(entities)
+
 # --- Testing Block ---
 if __name__ == "__main__":
+    from core.logging_config import configure_logging
+    configure_logging("DEBUG")
     print("\n--- Testing Spotify Handler ---")
 
     # Test Case 1: Artist and Language
@@ -0,0 +1,17 @@
+# backend/handlers/vehicle_handler.py
+# Simulated in-car actions: navigation, climate control and phone calls.
+# Registered in handlers/registry.py, which checks the required entities first.
+
+async def handle_navigation(text: str, entities: dict) -> str:
+    return f"Okay, setting up navigation to {entities['location']}."
+
+async def handle_temperature_change(text: str, entities: dict) -> str:
+    if "warmer" in text or "increase" in text or "up" in text:
+        return "Okay, making it a bit warmer in here."
+    elif "cooler" in text or "decrease" in text or "down" in text:
+        return "Okay, cooling things down for you."
+    else:
+        return "Adjusting the temperature."
+
+async def handle_calling(text: str, entities: dict) -> str:
+    return f"Calling {entities['contact_name']} now..."
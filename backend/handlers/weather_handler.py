@@ -1,11 +1,17 @@
 # backend/handlers/weather_handler.py
 
+import logging
 import os
 from dotenv import load_dotenv
 import requests
+import httpx
+
+from core.cache import AsyncLoadingCache
+from core.metrics import UPSTREAM_ERRORS
 
 # --- 1. Load Environment Variables ---
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 # --- 2. Initialize API Key ---
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
@@ -14,7 +20,101 @@ OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 if not OPENWEATHER_API_KEY:
     raise ValueError("OPENWEATHER_API_KEY is not set in the .env file!")
 
-# --- 3. The Main Handler Function ---
+# --- 3. Shared Helpers ---
+# OPENWEATHER_BASE_URL can point at a stand-in server (see bench/fake_services.py)
+BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "http://api.openweathermap.org/data/2.5/weather")
+REQUEST_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "5"))
+
+# Weather changes slowly, so successful lookups are cached per location.
+# Entries are fresh for WEATHER_CACHE_TTL seconds, then served stale for up to
+# WEATHER_CACHE_STALE_TTL more seconds while a background request refreshes them.
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+WEATHER_CACHE_STALE_TTL = float(os.getenv("WEATHER_CACHE_STALE_TTL", "1800"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "512"))
+
+# A single AsyncClient keeps a pool of keep-alive connections to OpenWeatherMap.
+# It is created on first use and closed by close_http_client() at shutdown.
+_async_client = None
+
+# The synchronous path shares one Session so it also reuses connections.
+_session = requests.Session()
+
+def _resolve_location(location: str | None) -> str:
+    # If the entity extractor didn't find a location, default to a known city
+    if not location:
+        logger.debug("No location provided, defaulting to Guwahati.")
+        return "Guwahati"
+    return location
+
+def _build_params(location: str) -> dict:
+    return {
+        "q": location,
+        "appid": OPENWEATHER_API_KEY,
+        "units": "metric"  # Get temperature in Celsius
+    }
+
+def _format_weather(location: str, weather_data: dict) -> str:
+    # Safely extract information using .get() to avoid errors if a key is missing
+    description = weather_data.get('weather', [{}])[0].get('description', 'N/A').capitalize()
+    temp = weather_data.get('main', {}).get('temp', 'N/A')
+    feels_like = weather_data.get('main', {}).get('feels_like', 'N/A')
+
+    result_string = (
+        f"Currently in {location}, it is {temp}°C and the sky is: {description}. "
+        f"It feels like {feels_like}°C."
+    )
+    logger.debug("Success: %s", result_string)
+    return result_string
+
+def _describe_http_error(status_code: int, location: str, http_err: Exception) -> str:
+    # Handle specific HTTP errors from the API
+    if status_code == 401:
+        error_message = "Error: Invalid API Key. Please check your OpenWeatherMap API key. Note: New keys can take a few minutes to an hour to activate."
+    elif status_code == 404:
+        error_message = f"Error: The city '{location}' could not be found."
+    else:
+        error_message = f"An HTTP error occurred: {http_err}"
+
+    logger.warning("%s", error_message)
+    UPSTREAM_ERRORS.inc(service="openweather")
+    return "Sorry, I couldn't fetch the weather right now."
+
+def _cache_key(location: str) -> str:
+    # "  new   Delhi" and "new delhi" share one cache entry
+    return " ".join(location.lower().split())
+
+def _get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(REQUEST_TIMEOUT),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60),
+        )
+    return _async_client
+
+async def _fetch_weather(key: str) -> dict:
+    # Loader for weather_cache: raises on any failure so errors are never cached
+    response = await _get_async_client().get(BASE_URL, params=_build_params(key))
+    response.raise_for_status()
+    return response.json()
+
+weather_cache = AsyncLoadingCache(
+    _fetch_weather,
+    maxsize=WEATHER_CACHE_SIZE,
+    ttl=WEATHER_CACHE_TTL,
+    stale_ttl=WEATHER_CACHE_STALE_TTL,
+    name="Weather Cache",
+    shared="weather",
+)
+
+async def close_http_client():
+    """Closes the pooled AsyncClient. Called when the FastAPI app shuts down."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+# --- 4. The Main Handler Functions ---
 def get_weather_for_location(location: str | None) -> str:
     """
     Fetches the current weather for a given location using the OpenWeatherMap API.
@@ -25,62 +125,73 @@ def get_weather_for_location(location: str | None) -> str:
     Returns:
         str: A formatted string with the weather description, or an error message.
     """
-    # If the entity extractor didn't find a location, default to a known city
-    if not location:
-        print("  [Weather Handler] No location provided, defaulting to Guwahati.")
-        location = "Guwahati"
+    location = _resolve_location(location)
+    key = _cache_key(location)
+    cached = weather_cache.get_cached(key)
+    if cached is not None:
+        logger.debug("Cache hit for: '%s'", location)
+        return _format_weather(location, cached)
+
+    logger.debug("Fetching current weather for: '%s'...", location)
 
-    print(f"  [Weather Handler] Fetching current weather for: '{location}'...")
-    base_url = "http://api.openweathermap.org/data/2.5/weather"
-    params = {
-        "q": location,
-        "appid": OPENWEATHER_API_KEY,
-        "units": "metric"  # Get temperature in Celsius
-    }
-    
     try:
-        response = requests.get(base_url, params=params)
+        response = _session.get(BASE_URL, params=_build_params(key), timeout=REQUEST_TIMEOUT)
         # This line will raise an error for bad status codes (4xx or 5xx)
         response.raise_for_status()
-        
         weather_data = response.json()
-        
-        # Safely extract information using .get() to avoid errors if a key is missing
-        description = weather_data.get('weather', [{}])[0].get('description', 'N/A').capitalize()
-        temp = weather_data.get('main', {}).get('temp', 'N/A')
-        feels_like = weather_data.get('main', {}).get('feels_like', 'N/A')
-        
-        result_string = (
-            f"Currently in {location}, it is {temp}°C and the sky is: {description}. "
-            f"It feels like {feels_like}°C."
-        )
-        print(f"  [Weather Handler] Success: {result_string}")
-        return result_string
-        
+        weather_cache.put(key, weather_data)
+        return _format_weather(location, weather_data)
+
     except requests.exceptions.HTTPError as http_err:
-        # Handle specific HTTP errors from the API
-        if response.status_code == 401:
-            error_message = "Error: Invalid API Key. Please check your OpenWeatherMap API key. Note: New keys can take a few minutes to an hour to activate."
-        elif response.status_code == 404:
-            error_message = f"Error: The city '{location}' could not be found."
-        else:
-            error_message = f"An HTTP error occurred: {http_err}"
-        
-        print(f"  [Weather Handler] {error_message}")
-        return "Sorry, I couldn't fetch the weather right now."
-        
+        return _describe_http_error(response.status_code, location, http_err)
+
     except requests.exceptions.RequestException as req_err:
         # Handle network-related errors (e.g., no internet connection)
-        print(f"  [Weather Handler] A network error occurred: {req_err}")
+        logger.warning("A network error occurred: %s", req_err)
+        UPSTREAM_ERRORS.inc(service="openweather")
         return "Sorry, I'm having trouble connecting to the weather service."
 
     except Exception as e:
         # Catch any other unexpected errors
-        print(f"  [Weather Handler] An unexpected error occurred: {e}")
+        logger.warning("An unexpected error occurred: %s", e)
+        UPSTREAM_ERRORS.inc(service="openweather")
         return "Sorry, an unexpected error occurred while fetching the weather."
 
+async def get_weather_for_location_async(location: str | None) -> str:
+    """
+    Awaitable version of get_weather_for_location. Lookups go through weather_cache:
+    repeated cities are answered from memory, concurrent misses for one city share
+    a single upstream call on the pooled httpx.AsyncClient, and stale entries are
+    returned instantly while they refresh in the background.
+    """
+    location = _resolve_location(location)
+    logger.debug("Looking up current weather for: '%s'...", location)
+
+    try:
+        weather_data = await weather_cache.get(_cache_key(location))
+        return _format_weather(location, weather_data)
+
+    except httpx.HTTPStatusError as http_err:
+        return _describe_http_error(http_err.response.status_code, location, http_err)
+
+    except httpx.RequestError as req_err:
+        logger.warning("A network error occurred: %s", req_err)
+        UPSTREAM_ERRORS.inc(service="openweather")
+        return "Sorry, I'm having trouble connecting to the weather service."
+
+    except Exception as e:
+        logger.warning("An unexpected error occurred: %s", e)
+        UPSTREAM_ERRORS.inc(service="openweather")
+        return "Sorry, an unexpected error occurred while fetching the weather."
+
+async def handle_weather(text: str, entities: dict) -> str:
+    """Entry point for the get_weather intent (see handlers/registry.py)."""
+    return await get_weather_for_location_async(entities.get("location"))
+
 # --- Testing Block ---
 if __name__ == "__main__":
+    from core.logging_config import configure_logging
+    configure_logging("DEBUG")
     print("\n--- Testing Weather Handler ---")
 
     # Test Case 1: A valid city
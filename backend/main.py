@@ -1,21 +1,90 @@
 # backend/main.py
 # This script creates a FastAPI web server for our backend logic.
 
-from fastapi import FastAPI
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+import json
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+# Logging goes through a background queue; configure it before the modules below log anything
+from core.logging_config import configure_logging
+configure_logging()
 
 # Import our existing modules
-from nlp.intent_classifier import get_intent
-from nlp.entity_extractor import extract_entities
-from handlers.spotify_handler import play_music_based_on_entities
-from handlers.weather_handler import get_weather_for_location
+from core.admission import Overloaded, PriorityLimiter
+from core.executor import shutdown_executors
+from core.metrics import COMMANDS, REQUEST_SECONDS, metrics
+from core.request_log import annotate, finish_record, request_log, start_record
+from core.shared_cache import shared_cache
+from core.startup import components
+from core.tracing import current_trace, span, start_trace
+from nlp.command_cache import command_cache
+from nlp.intent_classifier import get_intent_async, space_breaker
+from nlp.entity_extractor import (
+    NER_INTENTS,
+    EMOTION_INTENTS,
+    extract_entities_async,
+    start_speculative_inference,
+    discard_speculative_inference,
+    close_batchers,
+)
+from nlp.session_context import inherit_intent, merge_entities, refers_back, reusable_entities, sessions
+from handlers.registry import handler_registry
+
+logger = logging.getLogger(__name__)
 
 # --- 1. Initialize the FastAPI App ---
+# Set SPOTIFY_WARMUP=0 to skip pre-filling the playlist cache at startup.
+SPOTIFY_WARMUP = os.getenv("SPOTIFY_WARMUP", "1") == "1"
+
+# Comma-separated intents to turn off, e.g. "play_music". Models that only
+# disabled intents need are not loaded at startup.
+DISABLED_INTENTS = {intent.strip() for intent in os.getenv("DISABLED_INTENTS", "").split(",") if intent.strip()}
+
+def deferred_components() -> set:
+    """Components that no enabled intent needs, so they are only loaded on demand."""
+    deferred = set()
+    if NER_INTENTS <= DISABLED_INTENTS:
+        deferred.add("ner")
+    if EMOTION_INTENTS <= DISABLED_INTENTS:
+        deferred.add("emotion")
+    return deferred
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models and clients load in parallel in the background; /ready reports when they're done
+    components.start(skip=deferred_components())
+    # Warm-up runs in the background so it never delays startup
+    warm_up_task = None
+    if SPOTIFY_WARMUP and "play_music" not in DISABLED_INTENTS:
+        warm_up_task = asyncio.create_task(handler_registry.warm_up("play_music"))
+    yield
+    if warm_up_task:
+        warm_up_task.cancel()
+    # Release batching workers, pooled connections and worker threads on shutdown,
+    # writing any unsaved command cache entries first
+    await close_batchers()
+    await handler_registry.close()
+    command_cache.flush()
+    shared_cache.flush()
+    request_log.close()
+    shutdown_executors()
+    components.shutdown()
+
 app = FastAPI(
     title="Car AI Assistant API",
     description="API for the in-car AI assistant.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # --- 2. Configure CORS ---
@@ -33,78 +102,441 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], # Allow all methods (GET, POST, etc.)
     allow_headers=["*"], # Allow all headers
+    expose_headers=["Server-Timing"],
 )
 
+# --- 2b. Per-Request Stage Timings ---
+# Each request records how long its stages took (intent, ner, emotion, handler)
+# and returns them in the Server-Timing header. Set SERVER_TIMING=0 to turn the
+# header off; stage and request latencies are always recorded for /metrics.
+# The stage timings also go to the request log (core/request_log.py), if it's on.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+
+@app.middleware("http")
+async def add_server_timing(request, call_next):
+    start = time.perf_counter()
+    trace = start_trace() if SERVER_TIMING or request_log.enabled else None
+    response = await call_next(request)
+    # Unknown paths share one label so stray requests can't grow the metric without bound
+    path = request.url.path if response.status_code != 404 else "unmatched"
+    REQUEST_SECONDS.observe(time.perf_counter() - start, path=path)
+    if trace is not None and SERVER_TIMING:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
 # --- 3. Define Request/Response Models ---
 # This tells FastAPI what kind of data to expect in the request body.
 class CommandRequest(BaseModel):
     text: str
+    # Optional: commands with the same session id share context, so follow-ups
+    # like "what about in Delhi?" reuse the previous intent and entities
+    session_id: str | None = Field(None, max_length=128)
 
-# --- 4. Define Simulated Handlers (as before) ---
-def handle_navigation(entities: dict):
-    location = entities.get("location")
-    if location:
-        return f"Okay, setting up navigation to {location}."
-    else:
-        return "Where would you like to navigate to?"
+# Largest number of commands accepted by one /process-commands request.
+MAX_COMMAND_BATCH = int(os.getenv("MAX_COMMAND_BATCH", "1000"))
 
-def handle_temperature_change(text: str):
-    if "warmer" in text or "increase" in text or "up" in text:
-        return "Okay, making it a bit warmer in here."
-    elif "cooler" in text or "decrease" in text or "down" in text:
-        return "Okay, cooling things down for you."
-    else:
-        return "Adjusting the temperature."
+class CommandBatchRequest(BaseModel):
+    texts: list[str] = Field(..., min_length=1, max_length=MAX_COMMAND_BATCH)
+
+# --- 4. Handlers ---
+# Each intent's handler, its required entities and its budget (timeout,
+# concurrency, cache) are declared in handlers/registry.py and loaded on first use.
+
+# --- 5. The Command Pipeline ---
+NOT_UNDERSTOOD_RESPONSE = "I'm sorry, I'm having trouble understanding. Could you rephrase?"
+BUSY_RESPONSE = "I'm a bit overloaded right now. Please try again in a moment."
+
+# --- 5a. Admission Control ---
+# Interactive commands (/process-command and /ws) are admitted once their intent
+# is known: at most ADMISSION_MAX_CONCURRENCY run entity extraction and their
+# handler at once, and the rest wait in one bounded queue per priority class.
+# Safety-relevant intents are served first; music lookups go last and are the
+# first to be shed. Set ADMISSION_MAX_CONCURRENCY=0 to admit everything.
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+
+INTENT_PRIORITY = {
+    "navigate": "critical",
+    "call_person": "critical",
+    "get_weather": "standard",
+    "adjust_temperature": "standard",
+    "play_music": "background",
+}
+
+# Queue length per priority class, highest priority first
+ADMISSION_QUEUE_LIMITS = {
+    "critical": int(os.getenv("ADMISSION_QUEUE_CRITICAL", "64")),
+    "standard": int(os.getenv("ADMISSION_QUEUE_STANDARD", "32")),
+    "background": int(os.getenv("ADMISSION_QUEUE_BACKGROUND", "8")),
+}
+
+admission = PriorityLimiter(ADMISSION_MAX_CONCURRENCY, ADMISSION_QUEUE_LIMITS, ADMISSION_QUEUE_TIMEOUT)
 
-def handle_calling(entities: dict):
-    contact = entities.get("contact_name")
-    if contact:
-        return f"Calling {contact} now..."
+async def route_intent(intent: str, user_input: str, entities: dict, wait: bool = False) -> str:
+    """
+    Sends the command to the handler for its intent and returns the response text.
+    With `wait`, a busy handler is queued for instead of answered with BUSY (batches).
+    """
+    with span(f"handler.{intent}"):
+        return await handler_registry.run(intent, user_input, entities, wait=wait)
+
+async def run_for_intent(user_input: str, intent: str | None, speculative: dict | None = None,
+                         on_entities=None, session_id: str | None = None, wait: bool = False) -> str:
+    """
+    Runs entity extraction and the handler for a command whose intent is known.
+    `on_entities`, if given, is awaited with the entities before the handler runs,
+    and `wait` is passed on to route_intent.
+    With a `session_id`, follow-ups reuse or fill in the previous command's
+    entities (see nlp/session_context.py), and this command's are remembered.
+    """
+    COMMANDS.inc(intent=intent or "unknown")
+    if not intent:
+        discard_speculative_inference(speculative)
+        return NOT_UNDERSTOOD_RESPONSE
+
+    if intent in DISABLED_INTENTS:
+        discard_speculative_inference(speculative)
+        return "Sorry, that feature is turned off right now."
+
+    previous = sessions.get(session_id)
+    entities = reusable_entities(previous, intent, user_input)
+    if entities is not None:
+        discard_speculative_inference(speculative)
     else:
-        return "Who would you like me to call?"
+        entities = merge_entities(previous, intent, await extract_entities_async(user_input, intent, speculative))
+    sessions.update(session_id, intent, entities)
+    annotate(entities={field: value for field, value in entities.items() if value is not None})
+    if on_entities is not None:
+        await on_entities(entities)
+    return await route_intent(intent, user_input, entities, wait)
+
+async def run_admitted(user_input: str, intent: str | None, speculative: dict | None = None,
+                       on_entities=None, session_id: str | None = None) -> str:
+    """
+    run_for_intent behind admission control. Commands that aren't understood or
+    are turned off are answered at once and don't take a slot.
+
+    Raises:
+        Overloaded: The command was shed; nothing has been run for it.
+    """
+    if not intent or intent in DISABLED_INTENTS:
+        return await run_for_intent(user_input, intent, speculative)
+    try:
+        with span("admission"):
+            await admission.acquire(INTENT_PRIORITY.get(intent, "standard"))
+    except BaseException:
+        discard_speculative_inference(speculative)
+        raise
+    try:
+        return await run_for_intent(user_input, intent, speculative, on_entities, session_id)
+    finally:
+        admission.release()
+
+def start_command_inference(user_input: str, session_id: str | None) -> dict:
+    """
+    start_speculative_inference, unless the command will reuse its session's
+    entities, or admission control is saturated: a command that has to queue may
+    be shed, so its models only run once it has been admitted.
+    """
+    if admission.saturated or (refers_back(user_input) and sessions.get(session_id)):
+        return {}
+    return start_speculative_inference(user_input)
+
+async def classify_command(user_input: str, session_id: str | None) -> str | None:
+    """Classifies a command. A follow-up in a session may inherit the previous command's intent instead."""
+    with span("intent"):
+        return inherit_intent(sessions.get(session_id), user_input) or await get_intent_async(user_input)
+
+async def stream_command(user_input: str, emit, session_id: str | None = None) -> str:
+    """
+    Processes one command like /process-command, awaiting `emit(event, **fields)`
+    as each stage finishes: "intent" (unless the command is shed before it's
+    classified), "entities" (only for understood, enabled intents) and finally
+    "response", which carries the Server-Timing breakdown
+    and whether the command was shed by admission control ("degraded").
+    """
+    start = time.perf_counter()
+    trace = start_trace()
+    record = start_record("/ws", user_input, session_id)
+    intent, degraded = None, False
+    try:
+        admission.check_capacity()
+        await sessions.refresh(session_id)
+        speculative = start_command_inference(user_input, session_id)
+        intent = await classify_command(user_input, session_id)
+        try:
+            await emit("intent", intent=intent)
+        except BaseException:
+            discard_speculative_inference(speculative)
+            raise
+        response = await run_admitted(
+            user_input, intent, speculative,
+            on_entities=lambda entities: emit("entities", entities=entities),
+            session_id=session_id,
+        )
+    except Overloaded:
+        response, degraded = BUSY_RESPONSE, True
+    REQUEST_SECONDS.observe(time.perf_counter() - start, path="/ws")
+    finish_record(record, intent, response, "shed" if degraded else "ok", trace)
+    await emit("response", response=response, degraded=degraded, timing=trace.server_timing())
+    return response
 
-# --- 5. Create the Main API Endpoint ---
+async def run_batch_command(endpoint: str, user_input: str, intent: str | None) -> str:
+    """
+    run_for_intent for one command of a batch, recorded in the request log on its own.
+    A batch's commands wait for their handler's slots rather than being turned away.
+    """
+    record = start_record(endpoint, user_input)
+    response = await run_for_intent(user_input, intent, wait=True)
+    finish_record(record, intent, response)
+    return response
+
+async def classify_batch(texts: list) -> dict:
+    """
+    Classifies every distinct text once. Confident texts are answered by the
+    local model inline, and the ambiguous ones go to the Space concurrently.
+
+    Returns:
+        dict: text -> intent (or None).
+    """
+    unique_texts = list(dict.fromkeys(texts))
+    with span("intent"):
+        intents = await asyncio.gather(*(get_intent_async(text) for text in unique_texts))
+    return dict(zip(unique_texts, intents))
+
+# --- 6. Create the Main API Endpoints ---
 @app.post("/process-command")
 async def process_command(request: CommandRequest):
     """
     This is the main endpoint that receives a command from the frontend,
     processes it, and returns the assistant's response.
+
+    Every stage is awaited: blocking model and client calls run in the shared
+    worker pools (see core/executor.py), so one slow request never stalls the others.
     """
     user_input = request.text
-    print(f"\n[API] Received command: '{user_input}'")
+    logger.debug("Received command: '%s'", user_input)
+    record = start_record("/process-command", user_input, request.session_id)
 
-    # Step 1: Get Intent
-    intent = get_intent(user_input)
-    if not intent:
-        return {"response": "I'm sorry, I'm having trouble understanding. Could you rephrase?"}
-
-    # Step 2: Extract Entities
-    entities = extract_entities(user_input, intent)
-
-    # Step 3: Route to the Correct Handler
-    final_response = ""
-    if intent == 'play_music':
-        final_response = play_music_based_on_entities(entities)
-    elif intent == 'get_weather':
-        location = entities.get("location")
-        final_response = get_weather_for_location(location)
-    elif intent == 'navigate':
-        final_response = handle_navigation(entities)
-    elif intent == 'adjust_temperature':
-        final_response = handle_temperature_change(user_input)
-    elif intent == 'call_person':
-        final_response = handle_calling(entities)
-    else:
-        final_response = "I'm not sure how to handle that intent yet."
+    # Under overload the command is shed with a fast 503 instead of queueing
+    # indefinitely; when no queue has room, before even its intent is classified
+    intent = None
+    try:
+        admission.check_capacity()
 
-    print(f"[API] Sending response: '{final_response}'")
+        # Step 1: Get Intent
+        # Entity models start speculatively while the intent is classified, so the
+        # latency of the two stages overlaps instead of adding up. Follow-ups in a
+        # session can inherit the intent and entities of the previous command.
+        await sessions.refresh(request.session_id)
+        speculative = start_command_inference(user_input, request.session_id)
+        intent = await classify_command(user_input, request.session_id)
+
+        # Steps 2 and 3: Extract Entities and Route to the Correct Handler
+        final_response = await run_admitted(user_input, intent, speculative, session_id=request.session_id)
+    except Overloaded as e:
+        logger.debug("Shed '%s' (%s, %s)", user_input, e.priority_class, e.reason)
+        finish_record(record, intent, BUSY_RESPONSE, "shed", current_trace())
+        return JSONResponse(
+            status_code=503,
+            content={"response": BUSY_RESPONSE, "degraded": True},
+            headers={"Retry-After": "1"},
+        )
+
+    logger.debug("Sending response: '%s'", final_response)
+    finish_record(record, intent, final_response, trace=current_trace())
     return {"response": final_response}
 
-# --- 6. Add a Root Endpoint for Health Check ---
+@app.post("/process-commands")
+async def process_commands(request: CommandBatchRequest):
+    """
+    Processes many commands in one request (e.g. telemetry replays and QA runs)
+    and returns the results in input order.
+
+    Identical texts are processed once. All texts are classified up front, then
+    entity extraction runs for every text at once, so the NER/emotion
+    micro-batchers see full batches; identical weather and Spotify lookups are
+    coalesced by the handler caches. Batches are offline work, so they bypass
+    admission control (their size is capped by MAX_COMMAND_BATCH instead).
+    """
+    logger.debug("Received batch of %d commands", len(request.texts))
+    intents = await classify_batch(request.texts)
+    responses = dict(zip(
+        intents,
+        await asyncio.gather(*(
+            run_batch_command("/process-commands", text, intent) for text, intent in intents.items()
+        )),
+    ))
+    return {
+        "results": [
+            {"text": text, "intent": intents[text], "response": responses[text]}
+            for text in request.texts
+        ]
+    }
+
+@app.post("/process-commands/stream")
+async def process_commands_stream(request: CommandBatchRequest):
+    """
+    Streaming variant of /process-commands. Emits one NDJSON line per input
+    command as soon as its response is ready (so lines may arrive out of input
+    order); each line carries the command's `index` in the request.
+    """
+    logger.debug("Received streaming batch of %d commands", len(request.texts))
+    positions = {}
+    for index, text in enumerate(request.texts):
+        positions.setdefault(text, []).append(index)
+
+    async def process_one(text: str, intent: str | None):
+        return text, intent, await run_batch_command("/process-commands/stream", text, intent)
+
+    async def stream():
+        intents = await classify_batch(request.texts)
+        tasks = [asyncio.ensure_future(process_one(text, intent)) for text, intent in intents.items()]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                text, intent, response = await finished
+                for index in positions[text]:
+                    line = {"index": index, "text": text, "intent": intent, "response": response}
+                    yield json.dumps(line) + "\n"
+        finally:
+            # The client went away; stop work that nobody will read
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+# --- 6b. WebSocket Sessions ---
+# Commands one WebSocket session may have in progress at once. Further messages
+# aren't read until one finishes, so a fast sender is slowed down instead of
+# piling up work.
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "4"))
+
+def _parse_session_message(raw: str, fallback_id: int) -> tuple:
+    """
+    Accepts {"id": ..., "text": "..."} or a bare command string.
+
+    Returns:
+        tuple: (id, text), with text None if the message has no usable command.
+    """
+    try:
+        message = json.loads(raw)
+    except ValueError:
+        return fallback_id, raw.strip() or None
+    if isinstance(message, str):
+        return fallback_id, message.strip() or None
+    if not isinstance(message, dict):
+        return fallback_id, None
+    text = message.get("text")
+    if not isinstance(text, str):
+        text = ""
+    return message.get("id", fallback_id), text.strip() or None
+
+@app.websocket("/ws")
+async def command_session(websocket: WebSocket):
+    """
+    A conversational session over one connection, so follow-up commands skip
+    the connection setup and HTTP headers of a POST each.
+
+    The client sends {"id": ..., "text": "..."} per command. The server answers
+    with events carrying the same id, as soon as each stage is done:
+        {"id", "event": "intent", "intent"}
+        {"id", "event": "entities", "entities"}
+        {"id", "event": "response", "response", "timing"}
+        {"id", "event": "error", "detail"}
+    Commands run concurrently, so events of different ids can interleave.
+
+    The connection is one conversation: follow-ups build on its earlier commands.
+    Connect with ?session_id=... to share that context with POST /process-command
+    calls (or a later connection) that use the same id.
+    """
+    # CORS doesn't cover WebSockets, so browsers' origins are checked here
+    origin = websocket.headers.get("origin")
+    if origin is not None and origin not in origins:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    send_lock = asyncio.Lock()
+    slots = asyncio.Semaphore(WS_MAX_IN_FLIGHT)
+    tasks = set()
+    received = 0
+    client_session_id = websocket.query_params.get("session_id", "")[:128]
+    session_id = client_session_id or uuid.uuid4().hex
+
+    async def send(message_id, event: str, **fields):
+        async with send_lock:
+            await websocket.send_json({"id": message_id, "event": event, **fields})
+
+    async def handle(message_id, text: str):
+        try:
+            logger.debug("Received session command %s: '%s'", message_id, text)
+            await stream_command(text, lambda event, **fields: send(message_id, event, **fields), session_id)
+        except (WebSocketDisconnect, asyncio.CancelledError):
+            pass
+        except Exception:
+            logger.exception("Session command %s failed", message_id)
+            try:
+                await send(message_id, "error", detail=NOT_UNDERSTOOD_RESPONSE)
+            except Exception:
+                pass
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            # receive_text() fails on a binary frame, which would end the session
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            received += 1
+            raw = frame.get("text")
+            message_id, text = _parse_session_message(raw, received) if raw is not None else (received, None)
+            if text is None:
+                await send(message_id, "error", detail='Expected {"id": ..., "text": "..."} as a text frame.')
+                continue
+            await slots.acquire()
+            task = asyncio.create_task(handle(message_id, text))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # The client went away; stop work that nobody will read
+        for task in tasks:
+            task.cancel()
+        # A session the client named may continue elsewhere; an anonymous one can't
+        if not client_session_id:
+            sessions.end(session_id)
+
+# --- 7. Add a Root Endpoint for Health Check ---
+# Liveness: the process is up and serving HTTP.
 @app.get("/")
 def read_root():
     return {"status": "Car AI Assistant backend is running!"}
 
+# Readiness: every required model and client has finished loading.
+# Returns 503 until then so load balancers hold traffic back during cold start.
+@app.get("/ready")
+def read_ready():
+    ready = components.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "components": components.status(),
+            "circuits": {space_breaker.name: space_breaker.status()},
+            "admission": admission.status(),
+            "handlers": handler_registry.status(),
+            "shared_cache": shared_cache.status(),
+        },
+    )
+
+# Prometheus scrape target: stage/request latency histograms and counters by
+# intent, intent source, cache result and upstream error.
+@app.get("/metrics")
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # To run this server:
 # 1. Open a terminal in the 'backend' folder.
 # 2. Make sure your conda env is active.
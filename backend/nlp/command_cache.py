@@ -0,0 +1,290 @@
+# backend/nlp/command_cache.py
+# Memoizes the NLP pipeline (intent classification and entity extraction) on
+# normalized command text. In-car commands repeat a lot, so most of them can
+# skip the Space call and the BERT models entirely.
+#
+# The cache is an LRU bounded by (approximate) memory. It can optionally be
+# persisted to a SQLite file so it survives restarts, and backed by the shared
+# cache (core/shared_cache.py) so other processes reuse its results.
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+from core.executor import get_io_executor
+from core.metrics import CACHE_REQUESTS, COMMAND_CACHE_BYTES
+from core.shared_cache import shared_cache
+from core.startup import components
+
+logger = logging.getLogger(__name__)
+
+# --- 1. Configuration ---
+# COMMAND_CACHE=0 turns the cache off.
+COMMAND_CACHE_ENABLED = os.getenv("COMMAND_CACHE", "1") == "1"
+# Memory budget for cached results, in megabytes.
+COMMAND_CACHE_MAX_MB = float(os.getenv("COMMAND_CACHE_MAX_MB", "32"))
+# SQLite file to persist the cache in, e.g. "command_cache.sqlite3". Empty keeps it in memory only.
+# (backend/.cache is spotipy's token cache file, so it can't be used here.)
+COMMAND_CACHE_PATH = os.getenv("COMMAND_CACHE_PATH", "")
+# New entries are written to disk in batches of this size (and on shutdown).
+COMMAND_CACHE_FLUSH_EVERY = int(os.getenv("COMMAND_CACHE_FLUSH_EVERY", "64"))
+# How long intents and entities are kept in the shared cache, when it's on.
+COMMAND_CACHE_SHARED_TTL = float(os.getenv("COMMAND_CACHE_SHARED_TTL", "86400"))
+
+# Rough per-entry bookkeeping cost (OrderedDict node, tuple, str headers)
+ENTRY_OVERHEAD_BYTES = 200
+
+# --- 2. Normalization ---
+_APOSTROPHES = re.compile(r"['’]")
+_NON_WORD = re.compile(r"[^\w]+")
+
+def normalize_command(text: str) -> str:
+    """
+    "  Play some HAPPY songs!! " -> "play some happy songs". Case, punctuation and
+    whitespace differences map to the same cache key.
+    """
+    text = _APOSTROPHES.sub("", text.lower())
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+# --- 3. The Cache ---
+class CommandCache:
+    """
+    A thread-safe LRU of JSON-serializable results, evicted by total size.
+
+    Entries live in namespaces ("intent", "entities", ...) and are keyed by the
+    normalized command text plus optional extra parts (e.g. the intent). Values
+    are stored as JSON, which gives their size and means callers always get a
+    fresh copy they are free to modify.
+
+    Local misses fall through to the shared cache, and new results are written to
+    it. Shared keys include a digest of the fingerprint, so processes running
+    different models never read each other's results.
+    """
+
+    def __init__(self, max_bytes: int, path: str = "", flush_every: int = 64):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self._entries = OrderedDict()  # key -> JSON string
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._fingerprint = {}
+        self._shared_prefix = None
+        self._pending_writes = {}  # key -> (JSON string, used_at)
+        self._pending_deletes = set()
+        self._flushing = False
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(namespace: str, text: str, extra: tuple) -> str:
+        return "\x1f".join((namespace, normalize_command(text), *extra))
+
+    @staticmethod
+    def _size(key: str, encoded: str) -> int:
+        return len(key) + len(encoded) + ENTRY_OVERHEAD_BYTES
+
+    def add_fingerprint(self, name: str, value: str):
+        """
+        Records what produced the cached results (model ids, modes). A persisted
+        cache written under a different fingerprint is discarded on load.
+        """
+        self._fingerprint[name] = value
+        self._shared_prefix = None
+
+    def _shared_key(self, key: str) -> str:
+        if self._shared_prefix is None:
+            digest = hashlib.sha1(json.dumps(self._fingerprint, sort_keys=True).encode("utf-8")).hexdigest()
+            self._shared_prefix = digest[:12]
+        return f"{self._shared_prefix}\x1f{key}"
+
+    def get(self, namespace: str, text: str, *extra: str):
+        """Returns the cached value, or None. Counts towards the hit-rate metrics."""
+        value = self._get_local(namespace, text, extra)
+        if value is None and self._shared(text):
+            key = self._key(namespace, text, extra)
+            value = self._keep_shared(key, shared_cache.get(namespace, self._shared_key(key)))
+        return value
+
+    async def get_async(self, namespace: str, text: str, *extra: str):
+        """get() for callers on the event loop: the shared lookup runs in the IO pool."""
+        value = self._get_local(namespace, text, extra)
+        if value is None and self._shared(text):
+            key = self._key(namespace, text, extra)
+            shared_value, _ = await shared_cache.lookup_async(namespace, self._shared_key(key))
+            value = self._keep_shared(key, shared_value)
+        return value
+
+    def _get_local(self, namespace: str, text: str, extra: tuple):
+        value = self.peek(namespace, text, *extra)
+        if value is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache=f"Command Cache ({namespace})", result="miss")
+        else:
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache=f"Command Cache ({namespace})", result="hit")
+        return value
+
+    def peek(self, namespace: str, text: str, *extra: str):
+        """Like get(), without recording a hit or miss."""
+        if not COMMAND_CACHE_ENABLED or not text:
+            return None
+        key = self._key(namespace, text, extra)
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is None:
+                return None
+            self._entries.move_to_end(key)
+        return json.loads(encoded)
+
+    @staticmethod
+    def _shared(text: str) -> bool:
+        """Whether a local miss should be looked up in the shared cache."""
+        return COMMAND_CACHE_ENABLED and bool(text) and shared_cache.enabled
+
+    def _keep_shared(self, key: str, value):
+        """Keeps a shared hit locally, so the next lookup doesn't leave the process."""
+        if value is not None:
+            with self._lock:
+                self._store(key, json.dumps(value))
+        return value
+
+    def set(self, namespace: str, text: str, *extra: str, value):
+        if not COMMAND_CACHE_ENABLED or not text or value is None:
+            return
+        key = self._key(namespace, text, extra)
+        encoded = json.dumps(value)
+        shared_cache.set(namespace, self._shared_key(key), value)
+        should_flush = False
+        with self._lock:
+            self._store(key, encoded)
+            if self.path:
+                self._pending_writes[key] = (encoded, time.time())
+                self._pending_deletes.discard(key)
+                should_flush = len(self._pending_writes) >= self.flush_every and not self._flushing
+                if should_flush:
+                    self._flushing = True
+        if should_flush:
+            get_io_executor().submit(self.flush)
+
+    def _store(self, key: str, encoded: str):
+        # Callers hold self._lock
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= self._size(key, previous)
+        self._entries[key] = encoded
+        self._bytes += self._size(key, encoded)
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._size(evicted_key, evicted)
+            if self.path:
+                self._pending_writes.pop(evicted_key, None)
+                self._pending_deletes.add(evicted_key)
+        COMMAND_CACHE_BYTES.set(self._bytes)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            COMMAND_CACHE_BYTES.set(0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    # --- Persistence ---
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5)
+        connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, used_at REAL)")
+        connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        return connection
+
+    def load(self):
+        """
+        Fills the cache from the SQLite file, most recently used entries first,
+        until the memory budget is reached. Entries already cached are kept.
+        """
+        if not self.path or not COMMAND_CACHE_ENABLED:
+            return
+        fingerprint = json.dumps(self._fingerprint, sort_keys=True)
+        with closing(self._connect()) as connection, connection:
+            stored = connection.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+            if stored is None or stored[0] != fingerprint:
+                # Results from other models or modes would be wrong now
+                connection.execute("DELETE FROM entries")
+                connection.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+                logger.info("Command cache at '%s' started empty.", self.path)
+                return
+            rows = connection.execute("SELECT key, value FROM entries ORDER BY used_at DESC").fetchall()
+
+        loaded = []
+        budget = self.max_bytes
+        for key, encoded in rows:
+            budget -= self._size(key, encoded)
+            if budget < 0:
+                break
+            loaded.append((key, encoded))
+        with self._lock:
+            # Oldest first, so the most recently used rows end up at the LRU's fresh end
+            for key, encoded in reversed(loaded):
+                if key not in self._entries:
+                    self._store(key, encoded)
+                    self._entries.move_to_end(key, last=False)
+        logger.info("Loaded %d cached command results from '%s'.", len(loaded), self.path)
+
+    def flush(self):
+        """Writes new entries to the SQLite file and drops evicted ones."""
+        with self._lock:
+            writes, self._pending_writes = self._pending_writes, {}
+            deletes, self._pending_deletes = self._pending_deletes, set()
+        try:
+            if writes or deletes:
+                with closing(self._connect()) as connection, connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                        [(key, encoded, used_at) for key, (encoded, used_at) in writes.items()],
+                    )
+                    connection.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in deletes])
+        except sqlite3.Error as e:
+            logger.warning("Could not persist the command cache: %s", e)
+        finally:
+            with self._lock:
+                self._flushing = False
+
+command_cache = CommandCache(
+    max_bytes=int(COMMAND_CACHE_MAX_MB * 1024 * 1024),
+    path=COMMAND_CACHE_PATH,
+    flush_every=COMMAND_CACHE_FLUSH_EVERY,
+)
+shared_cache.namespace("intent", default_ttl=COMMAND_CACHE_SHARED_TTL)
+shared_cache.namespace("entities", default_ttl=COMMAND_CACHE_SHARED_TTL)
+
+# Loading a persisted cache reads a file, so it runs with the other background loaders
+if COMMAND_CACHE_PATH and COMMAND_CACHE_ENABLED:
+    components.register("command_cache", command_cache.load, required=False)
+
+# --- Testing Block ---
+# To run it, open a terminal in your `backend` folder and type:
+# python -m nlp.command_cache
+if __name__ == "__main__":
+    print("\n--- Testing Command Cache ---")
+    for raw in ["  Play some HAPPY songs!! ", "what's the weather in Delhi?", "Call   Mom."]:
+        print(f"'{raw}' -> '{normalize_command(raw)}'")
+
+    cache = CommandCache(max_bytes=1024)
+    cache.set("intent", "Call mom", value="call_person")
+    print(f"\nLookup 'call MOM!': {cache.get('intent', 'call MOM!')}")
+    for i in range(10):
+        cache.set("intent", f"command number {i}", value="navigate")
+    print(f"After filling a 1 KB cache: {len(cache)} entries, {cache.size_bytes} bytes")
+    print(f"Hits: {cache.hits}, misses: {cache.misses}")
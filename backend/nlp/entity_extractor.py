@@ -1,22 +1,89 @@
 # backend/nlp/entity_extractor.py
 
-from transformers import pipeline
-import re
+import asyncio
+import logging
+import os
+
+from core.batching import MicroBatcher
+from core.startup import components
+from core.tracing import span, timed
+from nlp.command_cache import command_cache
+from nlp.gazetteer import USE_GAZETTEER, Gazetteer
+
+logger = logging.getLogger(__name__)
 
 # --- 1. Initialize the Models (Pipelines) ---
-# This is done once when the module is first imported, making it efficient.
-try:
-    print("[Entity Extractor] Loading models...")
+# Models are not loaded at import time. Their loaders are registered with the
+# startup registry, which runs them in parallel in the background (see main.py)
+# or on first use. Each loader finishes with one warm-up inference so the first
+# real request doesn't pay for lazy initialization inside torch.
+ner_pipeline = None
+emotion_pipeline = None
+
+NER_MODEL_ID = "dslim/bert-base-NER"
+EMOTION_MODEL_ID = "bhadresh-savani/bert-base-go-emotion"
+
+# ENTITY_BACKEND selects how the models run:
+#   "torch" (default) - stock PyTorch transformers pipelines
+#   "onnx"            - int8-quantized ONNX Runtime graphs (see nlp/onnx_backend.py)
+#   "joint"           - one shared encoder for NER and emotion (see nlp/joint_model.py)
+ENTITY_BACKEND = os.getenv("ENTITY_BACKEND", "torch").lower()
+
+# Cached entities are only reused by a process running the same models
+command_cache.add_fingerprint("entities", f"{ENTITY_BACKEND}|{NER_MODEL_ID}|{EMOTION_MODEL_ID}")
+
+def _build_pipeline(task: str, model_id: str, **pipeline_kwargs):
+    if ENTITY_BACKEND == "onnx":
+        try:
+            from nlp.onnx_backend import build_pipeline
+            return build_pipeline(task, model_id, **pipeline_kwargs)
+        except ImportError as e:
+            logger.warning("ONNX backend unavailable (%s); falling back to PyTorch.", e)
+    elif ENTITY_BACKEND == "joint":
+        try:
+            from nlp.joint_model import build_pipeline
+            return build_pipeline(task, model_id, **pipeline_kwargs)
+        except FileNotFoundError as e:
+            logger.warning("Joint model unavailable (%s); falling back to separate models.", e)
+
+    # transformers/torch are imported here because importing them takes seconds
+    from transformers import pipeline
+    return pipeline(task, model=model_id, **pipeline_kwargs)
+
+NER_WARM_UP_TEXT = "Warm up the model for Arijit Singh in Guwahati"
+EMOTION_WARM_UP_TEXT = "Warm up the model with something happy"
+
+def load_ner_model():
+    global ner_pipeline
+    logger.info("Loading NER model (%s)...", ENTITY_BACKEND)
     # Pipeline for Named Entity Recognition (to find names, locations, etc.)
-    ner_pipeline = pipeline("ner", model="dslim/bert-base-NER", grouped_entities=True)
-    
+    model = _build_pipeline("ner", NER_MODEL_ID, grouped_entities=True)
+    model(NER_WARM_UP_TEXT)
+    ner_pipeline = model
+    logger.info("NER model loaded successfully.")
+
+def load_emotion_model():
+    global emotion_pipeline
+    logger.info("Loading emotion model (%s)...", ENTITY_BACKEND)
     # Pipeline for Emotion Classification (to find the mood)
-    emotion_pipeline = pipeline("text-classification", model="bhadresh-savani/bert-base-go-emotion")
-    print("[Entity Extractor] Models loaded successfully.")
-except Exception as e:
-    print(f"[Entity Extractor] Error loading models: {e}")
-    ner_pipeline = None
-    emotion_pipeline = None
+    model = _build_pipeline("text-classification", EMOTION_MODEL_ID)
+    model(EMOTION_WARM_UP_TEXT)
+    emotion_pipeline = model
+    logger.info("Emotion model loaded successfully.")
+
+def warm_up_models():
+    """
+    Runs one inference on each loaded model. Used by worker processes that were
+    forked with the models already loaded (see gunicorn.conf.py), so each worker
+    starts its own inference threads before its first request.
+    """
+    if ner_pipeline:
+        ner_pipeline(NER_WARM_UP_TEXT)
+    if emotion_pipeline:
+        emotion_pipeline(EMOTION_WARM_UP_TEXT)
+
+components.register("ner", load_ner_model)
+components.register("emotion", load_emotion_model)
 
 # --- 2. Define Helper Data ---
 # A simple list of languages we can search for
@@ -54,19 +121,67 @@ EMOTION_TO_MOOD_MAP = {
     'neutral': 'neutral'
 }
 
-# --- 3. The Main Extraction Function ---
-def extract_entities(text: str, intent: str) -> dict:
-    """
-    Extracts relevant entities from the text based on the classified intent.
+# Intents that need the NER model / the emotion model
+NER_INTENTS = {"play_music", "get_weather", "navigate", "call_person"}
+EMOTION_INTENTS = {"play_music"}
 
-    Args:
-        text (str): The user's input command.
-        intent (str): The intent classified by our primary model.
+# The entity field NER fills for each intent. If the gazetteer already found it,
+# the NER pass is skipped.
+NER_FIELDS = {
+    "play_music": "artist",
+    "get_weather": "location",
+    "navigate": "location",
+    "call_person": "contact_name",
+}
 
-    Returns:
-        dict: A dictionary containing the extracted entities.
-    """
-    entities = {
+# Known cities, contacts and artists (see gazetteers/) plus the supported languages,
+# compiled into one matcher. With USE_GAZETTEER=0 it only looks for languages.
+gazetteer = (
+    Gazetteer.from_directory(languages=SUPPORTED_LANGUAGES) if USE_GAZETTEER
+    else Gazetteer({}, languages=SUPPORTED_LANGUAGES)
+)
+command_cache.add_fingerprint("gazetteer", gazetteer.digest)
+
+# --- 3. Batched Inference ---
+# Concurrent requests are grouped into one padded forward pass per model.
+# INFERENCE_BATCH_SIZE caps the batch, INFERENCE_BATCH_WAIT_MS is how long the
+# first request in a batch waits for others to join.
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "16"))
+INFERENCE_BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "5"))
+
+def _run_ner_batch(texts: list) -> list:
+    results = ner_pipeline(texts, batch_size=len(texts))
+    # A single-item batch may come back unwrapped
+    if len(texts) == 1 and results and isinstance(results[0], dict):
+        results = [results]
+    return results
+
+def _run_emotion_batch(texts: list) -> list:
+    results = emotion_pipeline(texts, batch_size=len(texts))
+    # Each item is either the top {'label', 'score'} dict or a list of them
+    return [result[0]['label'] if isinstance(result, list) else result['label'] for result in results]
+
+ner_batcher = MicroBatcher(
+    _run_ner_batch, max_batch_size=INFERENCE_BATCH_SIZE, max_wait_ms=INFERENCE_BATCH_WAIT_MS, name="ner"
+)
+emotion_batcher = MicroBatcher(
+    _run_emotion_batch, max_batch_size=INFERENCE_BATCH_SIZE, max_wait_ms=INFERENCE_BATCH_WAIT_MS, name="emotion"
+)
+
+# SPECULATIVE_INFERENCE lets process_command start model work before the intent is known:
+#   "ner" (default) - start NER, which four of the five intents need
+#   "all"           - also start the emotion model (only play_music uses it)
+#   "off"           - wait for the intent first
+SPECULATIVE_INFERENCE = os.getenv("SPECULATIVE_INFERENCE", "ner").lower()
+
+async def close_batchers():
+    """Stops the batching workers. Called when the FastAPI app shuts down."""
+    await ner_batcher.close()
+    await emotion_batcher.close()
+
+# --- 4. The Main Extraction Functions ---
+def _empty_entities() -> dict:
+    return {
         "mood": None,
         "language": None,
         "artist": None,
@@ -74,57 +189,179 @@ def extract_entities(text: str, intent: str) -> dict:
         "contact_name": None,
     }
 
-    if not text or not intent:
-        return entities
+def _first_entity(ner_results: list | None, group: str) -> str | None:
+    for entity in ner_results or []:
+        if entity['entity_group'] == group:
+            return entity['word']
+    return None
+
+def _needs_ner(intent: str, matches: dict) -> bool:
+    return intent in NER_INTENTS and NER_FIELDS[intent] not in matches
+
+def _build_entities(text: str, intent: str, ner_results: list | None, emotion_label: str | None,
+                    matches: dict) -> dict:
+    """Turns gazetteer matches and raw model outputs into the entity dictionary for the given intent."""
+    entities = _empty_entities()
 
     # --- Entity Extraction for Music ---
     if intent == 'play_music':
-        # a) Extract Language (simple keyword search)
-        for lang in SUPPORTED_LANGUAGES:
-            if re.search(r'\b' + lang + r'\b', text.lower()):
-                entities["language"] = lang
-                break # Stop after finding the first language
-        
-        # b) Extract Artist (using NER)
-        if ner_pipeline:
-            ner_results = ner_pipeline(text)
-            for entity in ner_results:
-                if entity['entity_group'] == 'PER': # PER stands for Person
-                    entities["artist"] = entity['word']
-                    break # Stop after finding the first artist name
-        
+        # a) Extract Language (keyword match, found by the gazetteer)
+        entities["language"] = matches.get("language")
+
+        # b) Extract Artist (a known artist, else NER's first PER - Person)
+        entities["artist"] = matches.get("artist") or _first_entity(ner_results, 'PER')
+
         # c) Extract Mood (using emotion model)
         # This is a good fallback if no language or artist is mentioned.
-        if emotion_pipeline:
-            emotion_results = emotion_pipeline(text)
-            top_emotion = emotion_results[0]['label']
-            entities["mood"] = EMOTION_TO_MOOD_MAP.get(top_emotion, 'neutral')
+        if emotion_label:
+            entities["mood"] = EMOTION_TO_MOOD_MAP.get(emotion_label, 'neutral')
 
     # --- Entity Extraction for Weather or Navigation ---
     elif intent in ['get_weather', 'navigate']:
-        if ner_pipeline:
-            ner_results = ner_pipeline(text)
-            for entity in ner_results:
-                if entity['entity_group'] == 'LOC': # LOC stands for Location
-                    entities["location"] = entity['word']
-                    break # Stop after finding the first location
+        entities["location"] = matches.get("location") or _first_entity(ner_results, 'LOC') # LOC stands for Location
 
     # --- Entity Extraction for Calling ---
     elif intent == 'call_person':
+        entities["contact_name"] = matches.get("contact_name") or _first_entity(ner_results, 'PER')
+
+    logger.debug("Extracted Entities: %s", entities)
+    return entities
+
+def _models_available(intent: str, needs_ner: bool) -> bool:
+    # Entities extracted while a model was missing are incomplete and must not be cached
+    return (not needs_ner or ner_pipeline is not None) and (
+        intent not in EMOTION_INTENTS or emotion_pipeline is not None
+    )
+
+def extract_entities(text: str, intent: str) -> dict:
+    """
+    Extracts relevant entities from the text based on the classified intent.
+
+    Args:
+        text (str): The user's input command.
+        intent (str): The intent classified by our primary model.
+
+    Returns:
+        dict: A dictionary containing the extracted entities.
+    """
+    if not text or not intent:
+        return _empty_entities()
+
+    # Repeated commands reuse their earlier entities. Keys ignore case and
+    # punctuation, so the first spelling seen decides the (cased) entity values.
+    cached = command_cache.get("entities", text, intent)
+    if cached is not None:
+        return cached
+
+    matches = gazetteer.lookup(text)
+    needs_ner = _needs_ner(intent, matches)
+    ner_results = None
+    if needs_ner:
+        components.ensure_sync("ner")
         if ner_pipeline:
-            ner_results = ner_pipeline(text)
-            for entity in ner_results:
-                if entity['entity_group'] == 'PER': # PER stands for Person
-                    entities["contact_name"] = entity['word']
-                    break # Stop after finding the first person's name
+            with span("ner"):
+                ner_results = ner_pipeline(text)
+
+    emotion_label = None
+    if intent in EMOTION_INTENTS:
+        components.ensure_sync("emotion")
+        if emotion_pipeline:
+            with span("emotion"):
+                emotion_label = emotion_pipeline(text)[0]['label']
+
+    entities = _build_entities(text, intent, ner_results, emotion_label, matches)
+    if _models_available(intent, needs_ner):
+        command_cache.set("entities", text, intent, value=entities)
+    return entities
+
+async def _resolved(value):
+    return value
+
+def start_speculative_inference(text: str) -> dict:
+    """
+    Starts model inference for the text before its intent is known.
+
+    Returns:
+        dict: Running tasks keyed by model name ("ner", "emotion"). Pass it to
+              extract_entities_async, which uses the results it needs and cancels
+              the rest, or to discard_speculative_inference if no intent was found.
+    """
+    tasks = {}
+    if not text or SPECULATIVE_INFERENCE not in ("ner", "all"):
+        return tasks
+    # A fully cached command needs no inference at all
+    cached_intent = command_cache.peek("intent", text)
+    if cached_intent and command_cache.peek("entities", text, cached_intent) is not None:
+        return tasks
+    # A known city, contact or artist usually means NER won't be needed
+    if ner_pipeline and not set(gazetteer.lookup(text)) & set(NER_FIELDS.values()):
+        tasks["ner"] = asyncio.ensure_future(timed("ner", ner_batcher.submit, text))
+    if SPECULATIVE_INFERENCE == "all" and emotion_pipeline:
+        tasks["emotion"] = asyncio.ensure_future(timed("emotion", emotion_batcher.submit, text))
+    return tasks
+
+def discard_speculative_inference(speculative: dict | None):
+    """Cancels speculative tasks whose results will not be used."""
+    for task in (speculative or {}).values():
+        task.cancel()
+
+async def extract_entities_async(text: str, intent: str, speculative: dict | None = None) -> dict:
+    """
+    Awaitable version of extract_entities. Inference requests are submitted to
+    the NER/emotion micro-batchers and the two models run concurrently, so
+    concurrent commands share forward passes in the bounded model pool.
+
+    Args:
+        speculative (dict | None): Tasks from start_speculative_inference. Results
+            that are needed are reused; the others are cancelled.
+    """
+    speculative = dict(speculative or {})
+    if not text or not intent:
+        discard_speculative_inference(speculative)
+        return _empty_entities()
+
+    try:
+        cached = await command_cache.get_async("entities", text, intent)
+    except BaseException:
+        discard_speculative_inference(speculative)
+        raise
+    if cached is not None:
+        discard_speculative_inference(speculative)
+        return cached
+
+    # Known entities come from the gazetteer in microseconds; NER only runs for the rest
+    matches = gazetteer.lookup(text)
+    needs_ner = _needs_ner(intent, matches)
+
+    # Models that are still loading (or were deferred) are awaited here
+    if needs_ner:
+        await components.ensure("ner")
+    if intent in EMOTION_INTENTS:
+        await components.ensure("emotion")
+
+    ner_step = None
+    if needs_ner and ner_pipeline:
+        ner_step = speculative.pop("ner", None) or timed("ner", ner_batcher.submit, text)
+
+    emotion_step = None
+    if intent in EMOTION_INTENTS and emotion_pipeline:
+        emotion_step = speculative.pop("emotion", None) or timed("emotion", emotion_batcher.submit, text)
 
-    print(f"  [Entity Extractor] Extracted Entities: {entities}")
+    discard_speculative_inference(speculative)
+    ner_results, emotion_label = await asyncio.gather(
+        ner_step or _resolved(None), emotion_step or _resolved(None)
+    )
+    entities = _build_entities(text, intent, ner_results, emotion_label, matches)
+    if _models_available(intent, needs_ner):
+        command_cache.set("entities", text, intent, value=entities)
     return entities
 
 # --- Testing Block ---
 # To run it, open a terminal in your `backend` folder and type:
-# python nlp/entity_extractor.py
+# python -m nlp.entity_extractor
 if __name__ == "__main__":
+    from core.logging_config import configure_logging
+    configure_logging("DEBUG")
     print("\n--- Testing Entity Extractor ---")
 
     # Test Case 1: Music with mood and language
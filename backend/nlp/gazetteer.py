@@ -0,0 +1,299 @@
+# backend/nlp/gazetteer.py
+# Dictionary-based entity matching. Known cities, contacts, artists and languages
+# are compiled into one Aho-Corasick automaton, which finds every occurrence in a
+# command in a single pass over its characters. When it finds the entity an intent
+# needs, the BERT NER model doesn't have to run at all.
+
+import csv
+import hashlib
+import os
+import random
+import time
+
+# --- 1. Configuration ---
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Folder with the gazetteer files below (one entry per line, "#" comments).
+GAZETTEER_DIR = os.getenv("GAZETTEER_DIR", os.path.join(BACKEND_DIR, "gazetteers"))
+# USE_GAZETTEER=0 always uses the NER model.
+USE_GAZETTEER = os.getenv("USE_GAZETTEER", "1") == "1"
+
+# Files loaded from GAZETTEER_DIR, and the entity field each one fills
+GAZETTEER_FILES = {
+    "cities.txt": "location",
+    "contacts.txt": "contact_name",
+    "artists.txt": "artist",
+}
+
+def _fold(text: str) -> str:
+    # Case and apostrophe style don't matter ("Dad’s" finds "dad")
+    return text.lower().replace("’", "'")
+
+# --- 2. The Automaton ---
+class AhoCorasick:
+    """
+    Multi-pattern string matcher.
+
+    Patterns are stored in a trie of dicts; failure links let the search continue
+    from the longest matching suffix after a mismatch, so the text is scanned once
+    no matter how many patterns there are. Matches must start and end on word
+    boundaries, and overlapping matches resolve to the leftmost, then longest.
+    """
+
+    def __init__(self):
+        self._goto = [{}]     # node -> {char: node}
+        self._fail = [0]      # node -> failure node
+        self._output = [()]   # node -> ((length, kind, value), ...) of patterns ending here
+        self._built = False
+
+    def add(self, pattern: str, kind: str, value: str | None = None):
+        """Adds a pattern; matches report `value` (defaults to the pattern as written)."""
+        node = 0
+        for char in _fold(pattern):
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            node = next_node
+        self._output[node] += ((len(_fold(pattern)), kind, value or pattern),)
+        self._built = False
+
+    def build(self):
+        """Computes failure links breadth-first. Called automatically before searching."""
+        queue = list(self._goto[0].values())
+        for node in queue:
+            self._fail[node] = 0
+        position = 0
+        while position < len(queue):
+            node = queue[position]
+            position += 1
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                # Patterns that end at the failure node also end here
+                self._output[child] += self._output[self._fail[child]]
+        self._built = True
+
+    def find_all(self, text: str) -> list:
+        """
+        Returns:
+            list: (start, end, kind, value) tuples in text order, without overlaps.
+        """
+        if not self._built:
+            self.build()
+        folded = _fold(text)
+        goto, fail, output = self._goto, self._fail, self._output
+        candidates = []
+        node = 0
+        for index, char in enumerate(folded):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, kind, value in output[node]:
+                start = index + 1 - length
+                if _is_boundary(folded, start - 1) and _is_boundary(folded, index + 1):
+                    candidates.append((start, index + 1, kind, value))
+
+        # Leftmost, then longest, skipping anything that overlaps an accepted match
+        candidates.sort(key=lambda match: (match[0], match[0] - match[1]))
+        matches = []
+        covered_until = 0
+        for match in candidates:
+            if match[0] >= covered_until:
+                matches.append(match)
+                covered_until = match[1]
+        return matches
+
+def _is_boundary(text: str, index: int) -> bool:
+    return index < 0 or index >= len(text) or not text[index].isalnum()
+
+# --- 3. Loading the Gazetteers ---
+def read_entries(path: str) -> list:
+    """Reads one entry per line, skipping blank lines and "#" comments."""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip() and not line.lstrip().startswith("#")]
+
+class Gazetteer:
+    """
+    Looks up known entities in a command.
+
+    lookup() returns the first match of each kind, keyed by the entity field it
+    fills (e.g. {"location": "New York", "language": "hindi"}). A match that is
+    only part of a longer proper noun ("Sydney" in "Sydney Opera House", "Geneva"
+    in "Lake Geneva") is ignored, so NER sees the whole name instead.
+    """
+
+    def __init__(self, entries: dict, languages=()):
+        """
+        Args:
+            entries (dict): entity field -> list of names.
+            languages: Language names, reported lowercased under "language".
+        """
+        self.entries = {field: list(names) for field, names in entries.items()}
+        self.languages = tuple(languages)
+        self.matcher = AhoCorasick()
+        self.size = 0
+        digest = hashlib.sha1()
+        for field, names in entries.items():
+            for name in names:
+                self.matcher.add(name, field)
+                self.size += 1
+                digest.update(f"{field}:{name}\n".encode())
+        for language in sorted(languages):
+            self.matcher.add(language, "language", language.lower())
+            self.size += 1
+            digest.update(f"language:{language}\n".encode())
+        self.matcher.build()
+        # Identifies the entries, so caches of earlier results can tell when they change
+        self.digest = digest.hexdigest()[:12]
+
+    @classmethod
+    def from_directory(cls, directory: str = GAZETTEER_DIR, languages=()) -> "Gazetteer":
+        entries = {
+            field: read_entries(os.path.join(directory, file_name))
+            for file_name, field in GAZETTEER_FILES.items()
+        }
+        return cls(entries, languages)
+
+    def lookup(self, text: str) -> dict:
+        found = {}
+        if not text:
+            return found
+        for start, end, field, value in self.matcher.find_all(text):
+            if field in found:
+                continue
+            # Languages are adjectives ("Hindi Bollywood songs"), so they don't need the check
+            if field == "language" or not _inside_proper_noun(text, start, end):
+                found[field] = value
+        return found
+
+def _inside_proper_noun(text: str, start: int, end: int) -> bool:
+    """True if a capitalized word directly follows the match, or precedes it mid-sentence."""
+    following = text[end:].split(None, 1)
+    if text[end:end + 1] == " " and following and following[0][:1].isupper():
+        return True
+    before = text[:start]
+    preceding = before.split()
+    if before.endswith(" ") and preceding and preceding[-1][:1].isupper():
+        # The first word of a sentence is capitalized anyway ("Call Mom")
+        sentence_start = len(preceding) == 1 or preceding[-2][-1:] in ".!?"
+        return not sentence_start
+    return False
+
+# --- 4. Accuracy Report ---
+def report_accuracy(gazetteer: Gazetteer, ner=None, dataset_path: str | None = None,
+                    holdout: float = 0.5, seed: int = 0) -> dict:
+    """
+    Runs the gazetteer over held-out dataset.csv commands whose intent needs one
+    entity (get_weather, navigate, call_person, and artists for play_music).
+
+    The lists were written with dataset.csv at hand, so scoring them on all of it
+    would be circular. Instead the commands are split (deterministically for a
+    `seed`): entries that only the held-out commands mention are removed, as if
+    the lists had been built from the other commands alone, and only the held-out
+    commands are scored.
+
+    Reports per intent how many commands the gazetteer resolves (i.e. how often
+    NER is skipped). If a NER pipeline is given, the gazetteer's answers are
+    compared with the model's on the same commands.
+
+    Returns:
+        dict: intent -> stats, plus "_split" with the command counts and how many
+            entries were removed.
+    """
+    from nlp.local_intent import DATASET_PATH
+
+    fields = {"get_weather": "location", "navigate": "location", "call_person": "contact_name", "play_music": "artist"}
+    groups = {"get_weather": "LOC", "navigate": "LOC", "call_person": "PER", "play_music": "PER"}
+    report = {}
+    with open(dataset_path or DATASET_PATH, newline="", encoding="utf-8") as file:
+        rows = [row for row in csv.DictReader(file) if row["intent"] in fields]
+    random.Random(seed).shuffle(rows)
+    cut = int(len(rows) * holdout)
+    held_out, seen_rows = rows[:cut], rows[cut:]
+
+    def mentioned(some_rows) -> set:
+        return {
+            (field, _fold(value))
+            for row in some_rows
+            for field, value in gazetteer.lookup(row["text"]).items()
+            if field != "language"
+        }
+
+    unseen = mentioned(held_out) - mentioned(seen_rows)
+    held_out_gazetteer = Gazetteer(
+        {field: [name for name in names if (field, _fold(name)) not in unseen] for field, names in gazetteer.entries.items()},
+        gazetteer.languages,
+    )
+    report["_split"] = {"held_out": len(held_out), "seen": len(seen_rows), "entries_removed": len(unseen)}
+
+    for intent, field in fields.items():
+        texts = [row["text"] for row in held_out if row["intent"] == intent]
+        start = time.perf_counter()
+        found = [held_out_gazetteer.lookup(text).get(field) for text in texts]
+        elapsed = time.perf_counter() - start
+        stats = {
+            "commands": len(texts),
+            "resolved": sum(value is not None for value in found),
+            "lookup_us": round(elapsed / max(1, len(texts)) * 1e6, 1),
+        }
+        if ner is not None:
+            agree, ner_empty, disagreements = 0, 0, []
+            for text, value in zip(texts, found):
+                if value is None:
+                    continue
+                ner_value = next(
+                    (entity["word"] for entity in ner(text) if entity["entity_group"] == groups[intent]), None
+                )
+                if ner_value is None:
+                    ner_empty += 1
+                elif _fold(ner_value) == _fold(value):
+                    agree += 1
+                else:
+                    disagreements.append((text, value, ner_value))
+            stats.update({"agree_with_ner": agree, "ner_found_nothing": ner_empty, "disagreements": disagreements})
+        report[intent] = stats
+    return report
+
+# --- Testing Block ---
+# To run it, open a terminal in your `backend` folder and type:
+# python -m nlp.gazetteer          (add --no-ner to skip the comparison with the NER model)
+if __name__ == "__main__":
+    import sys
+
+    print("\n--- Testing Gazetteer ---")
+    gazetteer = Gazetteer.from_directory(languages=["hindi", "english", "punjabi"])
+    print(f"Loaded {gazetteer.size} entries from {GAZETTEER_DIR}")
+    for text in ["What's the weather in new york?", "Call Mom's mobile", "play some punjabi songs by Diljit Dosanjh"]:
+        print(f"'{text}' -> {gazetteer.lookup(text)}")
+
+    ner = None
+    if "--no-ner" not in sys.argv:
+        try:
+            from transformers import pipeline
+            ner = pipeline("ner", model="dslim/bert-base-NER", grouped_entities=True)
+        except ImportError as e:
+            print(f"\nNER model unavailable ({e}); reporting coverage only.")
+
+    report = report_accuracy(gazetteer, ner)
+    split = report.pop("_split")
+    print(f"\nAccuracy on {split['held_out']} held-out dataset.csv commands "
+          f"({split['entries_removed']} entries only they mention removed):")
+    for intent, stats in report.items():
+        line = f"  {intent:<12} resolved {stats['resolved']:>3}/{stats['commands']} ({stats['lookup_us']} us/lookup)"
+        if "agree_with_ner" in stats:
+            compared = stats["agree_with_ner"] + len(stats["disagreements"])
+            line += f", agrees with NER on {stats['agree_with_ner']}/{compared}"
+            line += f", NER found nothing on {stats['ner_found_nothing']}"
+        print(line)
+        for text, value, ner_value in stats.get("disagreements", [])[:5]:
+            print(f"      '{text}': gazetteer '{value}', NER '{ner_value}'")
@@ -1,22 +1,88 @@
 # backend/nlp/intent_classifier.py
 # FINAL VERSION: This file calls the Gradio Space API using the official gradio_client library.
 
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from gradio_client import Client, exceptions
 from urllib.parse import urlparse
 
+from core.executor import run_io
+from core.metrics import INTENT_SOURCE, UPSTREAM_ERRORS
+from core.resilience import CircuitBreaker, LatencyTracker, hedged
+from core.startup import components
+from nlp.command_cache import command_cache
+from nlp.local_intent import LocalIntentClassifier
+
 # --- 1. Load Environment Variables ---
 load_dotenv()
+logger = logging.getLogger(__name__)
+
+# --- 2. Configure the Classification Mode ---
+# INTENT_MODE selects where intents come from:
+#   "hybrid" (default) - the local model answers confident inputs, ambiguous ones go to the Space
+#   "local"            - never call the Space
+#   "remote"           - always call the Space (the original behaviour); the local
+#                        model is only used while the Space is failing
+INTENT_MODE = os.getenv("INTENT_MODE", "hybrid").lower()
+if INTENT_MODE not in ("hybrid", "local", "remote"):
+    raise ValueError(f"INTENT_MODE must be 'hybrid', 'local' or 'remote', got '{INTENT_MODE}'.")
+
+# Local predictions below this softmax confidence are escalated to the Space in hybrid mode.
+LOCAL_INTENT_THRESHOLD = float(os.getenv("LOCAL_INTENT_THRESHOLD", "0.6"))
+# Below this, a local prediction is no better than a guess (five intents share
+# 1.0, and gibberish scores around 0.25). Such commands are not understood,
+# both in local mode and when the local model stands in for the Space.
+LOCAL_INTENT_MIN_CONFIDENCE = float(os.getenv("LOCAL_INTENT_MIN_CONFIDENCE", "0.35"))
+
+# Optional precompiled model artifact (see LocalIntentClassifier.save). When unset,
+# the model is trained from dataset.csv at import, which takes well under a second.
+LOCAL_INTENT_MODEL_PATH = os.getenv("LOCAL_INTENT_MODEL_PATH")
+
+# The local model is built in every mode: in remote mode it is the fallback
+# while the Space's circuit breaker is open.
+local_classifier = None
+try:
+    if LOCAL_INTENT_MODEL_PATH and os.path.exists(LOCAL_INTENT_MODEL_PATH):
+        local_classifier = LocalIntentClassifier.load(LOCAL_INTENT_MODEL_PATH)
+    else:
+        local_classifier = LocalIntentClassifier.from_csv()
+    logger.info("Local intent classifier ready (%d intents, mode: %s).", len(local_classifier.labels), INTENT_MODE)
+except Exception as e:
+    logger.error("Failed to build local intent classifier: %s", e)
 
-# --- 2. Configure the Gradio Client ---
+# --- 3. Configure the Gradio Client ---
 # Get the standard URL of your running Hugging Face Space from the .env file
 # e.g., "https://huggingface.co/spaces/Vishalchand0808/car-intent-classifier-demo"
 SPACE_URL = os.getenv("HF_SPACE_URL")
 
-if not SPACE_URL:
+if not SPACE_URL and INTENT_MODE == "remote":
     raise ValueError("HF_SPACE_URL is not set in the .env file! Please add it.")
 
+# Guards for calls to the Space, which may be asleep, rebuilding or unreachable:
+#   INTENT_TIMEOUT                - deadline (seconds) for one Space call
+#   INTENT_BREAKER_FAILURES       - consecutive failures that open the circuit breaker
+#   INTENT_BREAKER_RESET_SECONDS  - how long the breaker stays open before a trial call,
+#                                   which first reconnects the client
+#   INTENT_HEDGE_PERCENTILE       - e.g. 95: send a duplicate call when the first is slower
+#                                   than this percentile of recent calls (0 = off)
+INTENT_TIMEOUT = float(os.getenv("INTENT_TIMEOUT", "3"))
+INTENT_BREAKER_FAILURES = int(os.getenv("INTENT_BREAKER_FAILURES", "5"))
+INTENT_BREAKER_RESET_SECONDS = float(os.getenv("INTENT_BREAKER_RESET_SECONDS", "30"))
+INTENT_HEDGE_PERCENTILE = float(os.getenv("INTENT_HEDGE_PERCENTILE", "0"))
+
+space_breaker = CircuitBreaker(
+    "intent_space", failure_threshold=INTENT_BREAKER_FAILURES, reset_timeout=INTENT_BREAKER_RESET_SECONDS
+)
+space_latency = LatencyTracker()
+
+# Cached intents are only reused by a process configured the same way
+command_cache.add_fingerprint(
+    "intent", f"{INTENT_MODE}|{LOCAL_INTENT_THRESHOLD}|{LOCAL_INTENT_MIN_CONFIDENCE}|{LOCAL_INTENT_MODEL_PATH}|{SPACE_URL}"
+)
+
 def get_space_id_from_url(space_url: str) -> str:
     """Extracts the 'username/repo_name' ID from a full Hugging Face Space URL."""
     parsed_url = urlparse(space_url)
@@ -25,22 +91,154 @@ def get_space_id_from_url(space_url: str) -> str:
         return f"{path_parts[1]}/{path_parts[2]}"
     raise ValueError("Invalid Hugging Face Space URL format. Expected format: https://huggingface.co/spaces/username/space-name")
 
-# Extract the Space ID (e.g., "Vishalchand0808/car-intent-classifier-demo")
-SPACE_ID = get_space_id_from_url(SPACE_URL)
+# The client is created by a background loader (see core/startup.py) because
+# connecting to the Space takes several seconds, and longer if it is asleep.
+client = None
 
-# Initialize the client with the Space ID
-try:
-    print(f"Initializing Gradio client for Space: '{SPACE_ID}'...")
-    client = Client(SPACE_ID)
-    print("Gradio client initialized successfully.")
-except Exception as e:
-    print(f"Failed to initialize Gradio client: {e}")
-    client = None
+def get_client_source(space_url: str) -> str:
+    """
+    Returns what gradio_client.Client should connect to: the Space ID for a
+    huggingface.co Space URL, or the URL itself for any other Gradio app
+    (e.g. a local stand-in such as http://127.0.0.1:7860/).
+    """
+    if urlparse(space_url).netloc.endswith("huggingface.co"):
+        return get_space_id_from_url(space_url)
+    return space_url
+
+def init_client():
+    global client
+    # Extract the Space ID (e.g., "Vishalchand0808/car-intent-classifier-demo")
+    space_id = get_client_source(SPACE_URL)
+    logger.info("Initializing Gradio client for Space: '%s'...", space_id)
+    client = Client(space_id)
+    logger.info("Gradio client initialized successfully.")
+
+if INTENT_MODE == "local":
+    logger.info("INTENT_MODE is 'local'; the Gradio Space will not be used.")
+elif not SPACE_URL:
+    logger.warning("HF_SPACE_URL is not set; falling back to the local intent classifier only.")
+else:
+    # In hybrid mode the local classifier covers for the Space while it connects
+    components.register("intent_space", init_client, required=INTENT_MODE == "remote")
+
+# --- 4. Classification Functions ---
+def classify_locally(text: str) -> tuple:
+    """
+    Classifies the text with the in-process model.
+
+    Returns:
+        tuple: (intent, confidence). intent is None if the local model is unavailable.
+    """
+    if not local_classifier or not text or not isinstance(text, str):
+        return None, 0.0
+    return local_classifier.predict(text)
+
+def _is_confident(intent: str | None, confidence: float) -> bool:
+    if INTENT_MODE == "remote":
+        return False
+    if INTENT_MODE == "local":
+        return intent is not None and confidence >= LOCAL_INTENT_MIN_CONFIDENCE
+    return intent is not None and confidence >= LOCAL_INTENT_THRESHOLD
+
+def _usable_guess(intent: str | None, confidence: float) -> str | None:
+    """The local prediction as a fallback answer, or None if it's too unsure to act on."""
+    return intent if confidence >= LOCAL_INTENT_MIN_CONFIDENCE else None
+
+def confident_local_intent(text: str) -> tuple:
+    """
+    Checks the text against the local model with LOCAL_INTENT_THRESHOLD, in every
+    INTENT_MODE (also "remote", where the model otherwise only serves as a fallback).
+
+    Returns:
+        tuple: (available, intent). available is False if there is no local model;
+            intent is None unless the model is confident.
+    """
+    intent, confidence = classify_locally(text)
+    if intent is None:
+        return False, None
+    return True, intent if confidence >= LOCAL_INTENT_THRESHOLD else None
 
 def get_intent(text: str) -> str | None:
+    """
+    Classifies the intent of the given text.
+
+    Confident local predictions are returned immediately; everything else goes to
+    the Space, with the local guess used as a fallback if the Space call fails.
+
+    Args:
+        text (str): The user's input command.
+
+    Returns:
+        str: The predicted intent label (e.g., 'play_music', 'get_weather').
+             Returns None if no classifier could produce an answer.
+    """
+    cached_intent = _cached_intent(text)
+    if cached_intent:
+        return cached_intent
+
+    local_intent, confidence = classify_locally(text)
+    if _is_confident(local_intent, confidence):
+        return _answer_locally(text, local_intent, confidence)
+    if INTENT_MODE == "local":
+        return _with_fallback(text, None, None)
+    if INTENT_MODE == "remote":
+        components.ensure_sync("intent_space")
+
+    return _with_fallback(text, get_remote_intent(text), _usable_guess(local_intent, confidence))
+
+def _cached_intent(text: str) -> str | None:
+    # Repeated commands (after normalization) skip both classifiers
+    intent = command_cache.get("intent", text)
+    if intent:
+        INTENT_SOURCE.inc(source="cache")
+    return intent
+
+async def _cached_intent_async(text: str) -> str | None:
+    intent = await command_cache.get_async("intent", text)
+    if intent:
+        INTENT_SOURCE.inc(source="cache")
+    return intent
+
+def _answer_locally(text: str, local_intent: str, confidence: float) -> str:
+    logger.debug("Local prediction: '%s' (confidence: %.2f)", local_intent, confidence)
+    INTENT_SOURCE.inc(source="local")
+    command_cache.set("intent", text, value=local_intent)
+    return local_intent
+
+def _with_fallback(text: str, remote_intent: str | None, local_intent: str | None) -> str | None:
+    # Records whether the Space answered, the local guess had to stand in, or
+    # nothing usable came back. Fallback answers are not cached, so the Space is
+    # asked again next time.
+    if remote_intent:
+        INTENT_SOURCE.inc(source="remote")
+        command_cache.set("intent", text, value=remote_intent)
+        return remote_intent
+    INTENT_SOURCE.inc(source="fallback" if local_intent else "none")
+    return local_intent
+
+_reconnect_lock = threading.Lock()
+
+def _reconnect() -> bool | None:
+    """
+    Creates a new Gradio client and returns whether that worked. Only one thread
+    reconnects at a time; others get None at once and fall back instead of waiting.
+    """
+    if not _reconnect_lock.acquire(blocking=False):
+        return None
+    try:
+        logger.info("Reconnecting to the intent Space...")
+        return components.reload("intent_space")
+    finally:
+        _reconnect_lock.release()
+
+def get_remote_intent(text: str) -> str | None:
     """
     Calls the deployed Gradio Space API to classify the intent of the given text.
 
+    Calls are rejected while the circuit breaker is open. The first call after
+    it has been open for INTENT_BREAKER_RESET_SECONDS (or any call after the
+    client failed to connect) re-creates the client first.
+
     Args:
         text (str): The user's input command.
 
@@ -48,49 +246,138 @@ def get_intent(text: str) -> str | None:
         str: The predicted intent label (e.g., 'play_music', 'get_weather').
              Returns None if the API call fails.
     """
-    if not client:
-        print("Gradio client is not available.")
-        return None
+    intent, reached = _call_space(text)
+    if reached:
+        _record_space_outcome(intent)
+    return intent
+
+def _call_space(text: str) -> tuple:
+    """
+    One attempt at get_remote_intent, without touching the circuit breaker's counts.
 
+    Returns:
+        tuple: (intent, reached). reached is False if the attempt was skipped
+            (open circuit, another thread reconnecting) and says nothing about the Space.
+    """
     if not text or not isinstance(text, str):
-        print("Invalid input text provided.")
-        return None
+        logger.debug("Invalid input text provided.")
+        return None, False
+
+    if not space_breaker.allow():
+        logger.debug("Intent Space circuit is open; skipping the call.")
+        return None, False
+
+    if space_breaker.in_trial or (not client and components.state("intent_space") == "failed"):
+        reconnected = _reconnect()
+        if not reconnected:
+            return None, reconnected is False
+
+    if not client:
+        logger.debug("Gradio client is not available.")
+        return None, False
+
+    start = time.perf_counter()
+    intent = _predict_remote(text)
+    if intent:
+        space_latency.observe(time.perf_counter() - start)
+    return intent, True
+
+def _record_space_outcome(intent: str | None):
+    if intent:
+        space_breaker.record_success()
+    else:
+        space_breaker.record_failure()
 
+def _predict_remote(text: str) -> str | None:
+    job = None
     try:
-        print(f"  [Intent Classifier] Predicting for text: '{text}'...")
-        # Use the predict method as shown in the API documentation
-        result = client.predict(
+        logger.debug("Predicting for text: '%s'...", text)
+        # Use the predict method as shown in the API documentation. submit() + result()
+        # is predict() with a deadline, so a sleeping Space can't hold the thread.
+        job = client.submit(
             text=text,
             api_name="/predict"
         )
+        result = job.result(timeout=INTENT_TIMEOUT)
         
         # The result is the raw string output from our Gradio function
         # e.g., "Intent: play_music (Score: 0.9987)"
         if "Intent: " in result:
             intent = result.split(" (")[0].replace("Intent: ", "")
-            print(f"  [Intent Classifier] Raw Response: {result}")
-            print(f"  [Intent Classifier] Predicted Intent: '{intent}'")
+            logger.debug("Raw Response: %s -> predicted intent '%s'", result, intent)
             return intent
         else:
-            print(f"  [Intent Classifier] Received an unexpected response from the Space: {result}")
+            logger.warning("Received an unexpected response from the Space: %s", result)
+            UPSTREAM_ERRORS.inc(service="intent_space")
             return None
 
+    except TimeoutError:
+        logger.warning("The intent Space did not answer within %.1f s.", INTENT_TIMEOUT)
+        UPSTREAM_ERRORS.inc(service="intent_space")
+        if job is not None:
+            job.cancel()
+        return None
     except exceptions.APIError as e:
         # This handles specific Gradio API errors, like if the Space is building
-        print(f"  [Intent Classifier] Gradio API error: {e}")
+        logger.warning("Gradio API error: %s", e)
+        UPSTREAM_ERRORS.inc(service="intent_space")
         return None
     except Exception as e:
         # This catches other errors (network, etc.)
-        print(f"  [Intent Classifier] An unexpected error occurred: {e}")
+        logger.warning("An unexpected error occurred: %s", e)
+        UPSTREAM_ERRORS.inc(service="intent_space")
         return None
 
+async def get_intent_async(text: str) -> str | None:
+    """
+    Awaitable version of get_intent. Confident local predictions are answered
+    inline; the Gradio client is synchronous, so Space calls run in the shared IO pool.
+    """
+    cached_intent = await _cached_intent_async(text)
+    if cached_intent:
+        return cached_intent
+
+    local_intent, confidence = classify_locally(text)
+    if _is_confident(local_intent, confidence):
+        return _answer_locally(text, local_intent, confidence)
+    if INTENT_MODE == "local":
+        return _with_fallback(text, None, None)
+    if INTENT_MODE == "remote":
+        await components.ensure("intent_space")
+    local_intent = _usable_guess(local_intent, confidence)
+    # Still connecting, or the Space is failing: answer locally without a thread hop
+    space_unavailable = not client and components.state("intent_space") != "failed"
+    if space_unavailable or space_breaker.is_open:
+        return _with_fallback(text, None, local_intent)
+
+    # Hedging starts once enough calls have been seen to know what "slow" is
+    hedge_after = space_latency.percentile(INTENT_HEDGE_PERCENTILE) if INTENT_HEDGE_PERCENTILE else None
+    # The breaker counts the command once, by the answer it got. A hedge's losing
+    # attempt keeps running in its thread after it's cancelled, so attempts only
+    # report whether they reached the Space, and their own outcomes are ignored.
+    reached = []
+
+    def attempt():
+        intent, attempt_reached = _call_space(text)
+        if attempt_reached:
+            reached.append(True)
+        return intent
+
+    remote_intent = await hedged(lambda: run_io(attempt), hedge_after, name="intent_space")
+    if reached:
+        _record_space_outcome(remote_intent)
+    return _with_fallback(text, remote_intent, local_intent)
+
 # --- Testing Block ---
 if __name__ == "__main__":
+    from core.logging_config import configure_logging
+    configure_logging("DEBUG")
     print("\n--- Testing Intent Classifier via Gradio Client ---")
     
-    if "YOUR_USERNAME" in SPACE_URL or not SPACE_URL:
+    if INTENT_MODE != "local" and (not SPACE_URL or "YOUR_USERNAME" in SPACE_URL):
         print("\n!!! PLEASE UPDATE the HF_SPACE_URL in your .env file with your actual Space URL before testing. !!!")
     else:
+        components.ensure_sync("intent_space")
         test_command = "it's a bit chilly in here"
         print(f"\nInput: '{test_command}'")
         predicted_intent = get_intent(test_command)
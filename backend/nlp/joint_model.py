@@ -0,0 +1,290 @@
+# backend/nlp/joint_model.py
+# Optional entity backend that runs one BERT encoder instead of two. The NER
+# model's encoder and token-classification head are used unchanged, and a small
+# emotion head reads the same hidden states, so a single tokenization and
+# forward pass yields both the entity spans and the emotion label.
+# Select it with ENTITY_BACKEND=joint after distilling the emotion head:
+# python -m nlp.joint_model distill
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# --- 1. Configuration ---
+# Where the distilled emotion head is stored (the encoder comes from the NER model).
+JOINT_MODEL_DIR = os.getenv(
+    "JOINT_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "joint_model"),
+)
+HEAD_WEIGHTS_FILE = "emotion_head.pt"
+HEAD_CONFIG_FILE = "emotion_head.json"
+
+# Recent results kept so the NER and emotion callers of one command share a pass
+JOINT_MEMO_SIZE = int(os.getenv("JOINT_MEMO_SIZE", "256"))
+
+def _build_head(torch, input_size: int, hidden_size: int, label_count: int):
+    return torch.nn.Sequential(
+        torch.nn.Dropout(0.1),
+        torch.nn.Linear(input_size, hidden_size),
+        torch.nn.GELU(),
+        torch.nn.Linear(hidden_size, label_count),
+    )
+
+def _mean_pool(hidden_states, attention_mask):
+    """Averages the hidden states of the real (non-padding) tokens."""
+    mask = attention_mask.unsqueeze(-1).to(hidden_states.dtype)
+    return (hidden_states * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1.0)
+
+# --- 2. The Joint Model ---
+class JointEntityModel:
+    """
+    NER pipeline plus an emotion head on its encoder.
+
+    A forward hook on the encoder captures the last hidden states while the stock
+    NER pipeline runs, so entity grouping and post-processing are exactly those
+    of the two-model setup. infer() computes each text once; the `ner` and
+    `emotion` adapters below are called like the pipelines they replace, and
+    whichever runs second for a command reuses the first one's pass.
+    """
+
+    def __init__(self, model_dir: str = JOINT_MODEL_DIR):
+        import torch
+        from transformers import AutoModelForTokenClassification, AutoTokenizer, pipeline
+
+        config_path = os.path.join(model_dir, HEAD_CONFIG_FILE)
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(f"No emotion head in {model_dir}; run `python -m nlp.joint_model distill`.")
+        with open(config_path, encoding="utf-8") as f:
+            self.config = json.load(f)
+
+        self._torch = torch
+        self.labels = self.config["labels"]
+        model = AutoModelForTokenClassification.from_pretrained(self.config["encoder"])
+        model.eval()
+        self.head = _build_head(torch, model.config.hidden_size, self.config["hidden_size"], len(self.labels))
+        self.head.load_state_dict(
+            torch.load(os.path.join(model_dir, HEAD_WEIGHTS_FILE), map_location="cpu", weights_only=True)
+        )
+        self.head.eval()
+
+        tokenizer = AutoTokenizer.from_pretrained(self.config["encoder"])
+        self._ner = pipeline("ner", model=model, tokenizer=tokenizer, grouped_entities=True)
+        self._captured = threading.local()
+        model.base_model.register_forward_hook(self._capture_emotions, with_kwargs=True)
+
+        self._memo = OrderedDict()  # text -> Future of (ner_results, emotion)
+        self._memo_lock = threading.Lock()
+
+    def _capture_emotions(self, module, args, kwargs, output):
+        # Runs inside the NER forward pass, in the calling thread
+        attention_mask = kwargs.get("attention_mask")
+        hidden_states = output[0]
+        if attention_mask is None:
+            attention_mask = self._torch.ones(hidden_states.shape[:2], dtype=self._torch.long)
+        probabilities = self.head(_mean_pool(hidden_states, attention_mask)).softmax(dim=-1)
+        scores, indices = probabilities.max(dim=-1)
+        self._captured.emotions.extend(
+            {"label": self.labels[index], "score": score} for index, score in zip(indices.tolist(), scores.tolist())
+        )
+
+    def _run(self, texts: list) -> list:
+        self._captured.emotions = []
+        with self._torch.inference_mode():
+            ner_results = self._ner(texts, batch_size=len(texts))
+        emotions = self._captured.emotions
+        return list(zip(ner_results, emotions))
+
+    def infer(self, texts: list) -> list:
+        """
+        Returns:
+            list: (ner_results, {"label", "score"}) for each text, in order.
+        """
+        owned, futures = [], []
+        with self._memo_lock:
+            for text in texts:
+                future = self._memo.get(text)
+                if future is None:
+                    future = Future()
+                    self._memo[text] = future
+                    owned.append((text, future))
+                    if len(self._memo) > JOINT_MEMO_SIZE:
+                        self._memo.popitem(last=False)
+                else:
+                    self._memo.move_to_end(text)
+                futures.append(future)
+
+        if owned:
+            try:
+                for (_, future), result in zip(owned, self._run([text for text, _ in owned])):
+                    future.set_result(result)
+            except BaseException as e:
+                with self._memo_lock:
+                    for text, future in owned:
+                        self._memo.pop(text, None)
+                        if not future.done():
+                            future.set_exception(e)
+                raise
+        return [future.result() for future in futures]
+
+    # Drop-in replacements for the two pipelines (see nlp/entity_extractor.py)
+    def ner(self, inputs, **kwargs):
+        if isinstance(inputs, str):
+            return self.infer([inputs])[0][0]
+        return [ner_results for ner_results, _ in self.infer(list(inputs))]
+
+    def emotion(self, inputs, **kwargs):
+        if isinstance(inputs, str):
+            return [self.infer([inputs])[0][1]]
+        return [emotion for _, emotion in self.infer(list(inputs))]
+
+_model = None
+_model_lock = threading.Lock()
+
+def build_pipeline(task: str, model_id: str, **pipeline_kwargs):
+    """
+    Returns the joint model's stand-in for the "ner" or "text-classification"
+    pipeline. Both share one JointEntityModel, loaded by whichever comes first.
+    """
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = JointEntityModel()
+    return _model.ner if task == "ner" else _model.emotion
+
+# --- 3. Distillation ---
+def distill(texts: list, output_dir: str = JOINT_MODEL_DIR, epochs: int = 300, hidden_size: int = 256,
+            temperature: float = 2.0, holdout: float = 0.2, batch_size: int = 32, seed: int = 0) -> dict:
+    """
+    Trains the emotion head to reproduce the current emotion model's label
+    distribution from the NER encoder's hidden states. The encoder and NER head
+    stay frozen, so entity output is unchanged; the encoder's features are
+    computed once and only the small head is trained.
+
+    Returns:
+        dict: Label and mood agreement with the teacher on the held-out texts.
+    """
+    import random
+
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoModelForTokenClassification, AutoTokenizer
+
+    from nlp.entity_extractor import EMOTION_MODEL_ID, EMOTION_TO_MOOD_MAP, NER_MODEL_ID
+
+    torch.manual_seed(seed)
+    texts = list(dict.fromkeys(texts))
+    random.Random(seed).shuffle(texts)
+
+    def encode(model_id, model_class, read):
+        tokenizer = AutoTokenizer.from_pretrained(model_id)
+        model = model_class.from_pretrained(model_id).eval()
+        outputs = []
+        with torch.no_grad():
+            for start in range(0, len(texts), batch_size):
+                batch = tokenizer(texts[start:start + batch_size], padding=True, truncation=True, return_tensors="pt")
+                outputs.append(read(model, batch))
+        return model, torch.cat(outputs)
+
+    logger.info("Running the teacher (%s) on %d texts...", EMOTION_MODEL_ID, len(texts))
+    teacher, teacher_logits = encode(
+        EMOTION_MODEL_ID, AutoModelForSequenceClassification, lambda model, batch: model(**batch).logits
+    )
+    labels = [teacher.config.id2label[index] for index in range(teacher.config.num_labels)]
+    del teacher
+
+    logger.info("Computing encoder features (%s)...", NER_MODEL_ID)
+    encoder, features = encode(
+        NER_MODEL_ID, AutoModelForTokenClassification,
+        lambda model, batch: _mean_pool(model.base_model(**batch)[0], batch["attention_mask"]),
+    )
+
+    cut = int(len(texts) * holdout)
+    train_x, train_y = features[cut:], teacher_logits[cut:]
+    test_x, test_y = features[:cut], teacher_logits[:cut]
+
+    head = _build_head(torch, encoder.config.hidden_size, hidden_size, len(labels))
+    optimizer = torch.optim.AdamW(head.parameters(), lr=1e-3, weight_decay=1e-4)
+    soft_targets = (train_y / temperature).softmax(dim=-1)
+    for epoch in range(epochs):
+        head.train()
+        order = torch.randperm(len(train_x))
+        for start in range(0, len(order), batch_size):
+            index = order[start:start + batch_size]
+            log_probs = (head(train_x[index]) / temperature).log_softmax(dim=-1)
+            loss = torch.nn.functional.kl_div(log_probs, soft_targets[index], reduction="batchmean") * temperature ** 2
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+        if (epoch + 1) % 50 == 0:
+            logger.info("Epoch %d: loss %.4f", epoch + 1, loss.item())
+
+    head.eval()
+    with torch.inference_mode():
+        predicted = head(test_x).argmax(dim=-1).tolist() if cut else []
+    expected = test_y.argmax(dim=-1).tolist() if cut else []
+
+    def mood(index):
+        return EMOTION_TO_MOOD_MAP.get(labels[index], "neutral")
+
+    report = {
+        "holdout_texts": cut,
+        "label_agreement": sum(a == b for a, b in zip(predicted, expected)) / max(1, cut),
+        "mood_agreement": sum(mood(a) == mood(b) for a, b in zip(predicted, expected)) / max(1, cut),
+    }
+
+    os.makedirs(output_dir, exist_ok=True)
+    torch.save(head.state_dict(), os.path.join(output_dir, HEAD_WEIGHTS_FILE))
+    with open(os.path.join(output_dir, HEAD_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "encoder": NER_MODEL_ID,
+            "teacher": EMOTION_MODEL_ID,
+            "labels": labels,
+            "hidden_size": hidden_size,
+            "temperature": temperature,
+            "training_texts": len(texts) - cut,
+            **report,
+        }, f, indent=2)
+    return report
+
+# --- Testing Block ---
+# Distill the emotion head from the current emotion model on dataset.csv, then
+# compare the joint backend with the two separate models (entity and mood
+# agreement, latency, peak RSS):
+# python -m nlp.joint_model distill [--epochs 300] [--hidden-size 256]
+# python -m nlp.joint_model compare [--max-rows 200]
+if __name__ == "__main__":
+    import argparse
+    import csv
+
+    from core.logging_config import configure_logging
+    from nlp.local_intent import DATASET_PATH
+    from nlp.onnx_backend import compare_backends
+
+    parser = argparse.ArgumentParser(description="Distill and evaluate the joint NER + emotion model.")
+    parser.add_argument("command", choices=["distill", "compare"])
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--output-dir", default=JOINT_MODEL_DIR)
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--hidden-size", type=int, default=256)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--max-rows", type=int)
+    args = parser.parse_args()
+    configure_logging("INFO")
+
+    with open(args.dataset, newline="", encoding="utf-8") as f:
+        texts = [row["text"] for row in csv.DictReader(f) if row.get("text")][:args.max_rows]
+
+    if args.command == "distill":
+        report = distill(texts, args.output_dir, args.epochs, args.hidden_size, args.temperature, args.holdout)
+        print(f"\nSaved the emotion head to {args.output_dir}")
+        print(f"Agreement with the teacher on {report['holdout_texts']} held-out texts:")
+        print(f"  emotion label: {report['label_agreement']:.3f}")
+        print(f"  mood:          {report['mood_agreement']:.3f}")
+    else:
+        os.environ["JOINT_MODEL_DIR"] = args.output_dir
+        compare_backends("joint", texts)
@@ -0,0 +1,176 @@
+# backend/nlp/local_intent.py
+# An in-process intent classifier trained from dataset.csv.
+# It is a nearest-centroid model over TF-IDF weighted character n-grams and words,
+# written in plain Python so it adds no dependencies and answers in microseconds.
+
+import csv
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+# --- 1. Configuration ---
+DATASET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset.csv")
+
+# Character n-grams make the model robust to typos and inflections ("warmer", "warm").
+NGRAM_RANGE = (2, 4)
+
+# Scales cosine similarities before the softmax so confidences are well spread.
+SOFTMAX_SCALE = 20.0
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# --- 2. Feature Extraction ---
+def _features(text: str) -> dict:
+    """Turns text into a bag of word and character n-gram counts with sublinear scaling."""
+    counts = Counter()
+    for word in _TOKEN_RE.findall(text.lower().replace("’", "'")):
+        counts["w:" + word] += 1
+        padded = f" {word} "
+        for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+            for i in range(len(padded) - n + 1):
+                counts[padded[i:i + n]] += 1
+    # Sublinear term frequency keeps repeated words from dominating
+    return {feature: 1.0 + math.log(count) for feature, count in counts.items()}
+
+def _normalize(vector: dict) -> dict:
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    if not norm:
+        return vector
+    return {feature: value / norm for feature, value in vector.items()}
+
+# --- 3. The Classifier ---
+class LocalIntentClassifier:
+    """
+    Nearest-centroid intent classifier.
+
+    Each intent is represented by the normalized mean of its training vectors.
+    At prediction time an inverted index maps every feature straight to its
+    per-intent weights, so scoring costs one dict lookup per feature.
+    """
+
+    def __init__(self, labels: list, idf: dict, centroids: dict):
+        self.labels = list(labels)
+        self.idf = idf
+        self.centroids = centroids
+        # feature -> tuple of weights, one per label
+        self._index = {}
+        for position, label in enumerate(self.labels):
+            for feature, weight in centroids[label].items():
+                weights = self._index.setdefault(feature, [0.0] * len(self.labels))
+                weights[position] = weight
+        self._index = {feature: tuple(weights) for feature, weights in self._index.items()}
+
+    @classmethod
+    def fit(cls, texts: list, labels: list) -> "LocalIntentClassifier":
+        """Builds the model from parallel lists of texts and intent labels."""
+        raw_vectors = [_features(text) for text in texts]
+
+        # Inverse document frequency over the training set
+        document_frequency = Counter()
+        for vector in raw_vectors:
+            document_frequency.update(vector.keys())
+        total = len(raw_vectors)
+        idf = {feature: math.log((1 + total) / (1 + df)) + 1.0 for feature, df in document_frequency.items()}
+
+        sums = defaultdict(lambda: defaultdict(float))
+        for vector, label in zip(raw_vectors, labels):
+            weighted = _normalize({feature: value * idf[feature] for feature, value in vector.items()})
+            for feature, value in weighted.items():
+                sums[label][feature] += value
+
+        centroids = {label: _normalize(dict(vector)) for label, vector in sums.items()}
+        return cls(sorted(centroids), idf, centroids)
+
+    @classmethod
+    def from_csv(cls, path: str = DATASET_PATH) -> "LocalIntentClassifier":
+        """Trains the model from a `text,intent` CSV file such as dataset.csv."""
+        texts, labels = [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                text, intent = (row.get("text") or "").strip(), (row.get("intent") or "").strip()
+                if text and intent:
+                    texts.append(text)
+                    labels.append(intent)
+        return cls.fit(texts, labels)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalIntentClassifier":
+        """Loads a model previously written with save()."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["labels"], data["idf"], data["centroids"])
+
+    def save(self, path: str):
+        """Writes the trained model as a compact JSON artifact."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"labels": self.labels, "idf": self.idf, "centroids": self.centroids}, f, separators=(",", ":"))
+
+    def scores(self, text: str) -> list:
+        """Returns the cosine similarity of the text to every intent centroid."""
+        vector = _features(text)
+        weighted = {feature: value * self.idf[feature] for feature, value in vector.items() if feature in self.idf}
+        norm = math.sqrt(sum(value * value for value in weighted.values()))
+        totals = [0.0] * len(self.labels)
+        if not norm:
+            return totals
+        for feature, value in weighted.items():
+            weights = self._index.get(feature)
+            if weights:
+                for position, weight in enumerate(weights):
+                    totals[position] += value * weight
+        return [total / norm for total in totals]
+
+    def predict(self, text: str) -> tuple:
+        """
+        Classifies the text.
+
+        Returns:
+            tuple: (intent, confidence), where confidence is a softmax probability in [0, 1].
+                   The intent is None when the text shares no features with the training data.
+        """
+        similarities = self.scores(text)
+        if not any(similarities):
+            return None, 0.0
+        peak = max(similarities)
+        exps = [math.exp(SOFTMAX_SCALE * (similarity - peak)) for similarity in similarities]
+        best = similarities.index(peak)
+        return self.labels[best], exps[best] / sum(exps)
+
+# --- Testing Block ---
+# Prints 5-fold cross-validated accuracy and per-call latency on dataset.csv:
+# python -m nlp.local_intent
+# Pass an output path to also write a precompiled artifact for LOCAL_INTENT_MODEL_PATH:
+# python -m nlp.local_intent intent_model.json
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+
+    with open(DATASET_PATH, newline="", encoding="utf-8") as f:
+        rows = [(row["text"], row["intent"]) for row in csv.DictReader(f) if row.get("text") and row.get("intent")]
+    random.Random(0).shuffle(rows)
+
+    folds = 5
+    correct = 0
+    for fold in range(folds):
+        test = rows[fold::folds]
+        train = [row for position, row in enumerate(rows) if position % folds != fold]
+        model = LocalIntentClassifier.fit([t for t, _ in train], [i for _, i in train])
+        correct += sum(model.predict(text)[0] == intent for text, intent in test)
+    print(f"Cross-validated accuracy: {correct / len(rows):.3f} over {len(rows)} rows")
+
+    model = LocalIntentClassifier.from_csv()
+    start = time.perf_counter()
+    for text, _ in rows:
+        model.predict(text)
+    elapsed = (time.perf_counter() - start) / len(rows)
+    print(f"Mean prediction latency: {elapsed * 1e6:.1f} µs")
+
+    for command in ["it's a bit chilly in here", "play some happy punjabi songs", "ring my brother"]:
+        print(f"'{command}' -> {model.predict(command)}")
+
+    if len(sys.argv) > 1:
+        model.save(sys.argv[1])
+        print(f"Saved model artifact to {sys.argv[1]}")
@@ -0,0 +1,176 @@
+# backend/nlp/onnx_backend.py
+# Optional CPU inference backend for the entity models: ONNX Runtime graphs with
+# dynamic int8 quantization, exported once with Hugging Face Optimum.
+# Select it with ENTITY_BACKEND=onnx (requires `pip install optimum[onnxruntime]`).
+
+import logging
+import os
+import resource
+import time
+
+logger = logging.getLogger(__name__)
+
+# --- 1. Configuration ---
+# Exported and quantized models are stored here, one folder per model.
+ONNX_MODEL_DIR = os.getenv(
+    "ONNX_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "onnx_models"),
+)
+
+# Threads ONNX Runtime may use inside one inference call (0 lets ORT decide).
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+
+QUANTIZED_FILE_NAME = "model_quantized.onnx"
+
+def _model_classes(task: str):
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTModelForTokenClassification
+
+    if task in ("ner", "token-classification"):
+        return ORTModelForTokenClassification
+    return ORTModelForSequenceClassification
+
+def _quantization_config():
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    # Dynamic quantization: int8 weights, activations quantized at runtime, so no
+    # calibration data is needed. VNNI instructions are used when the CPU has them.
+    try:
+        with open("/proc/cpuinfo") as f:
+            has_vnni = "avx512_vnni" in f.read()
+    except OSError:
+        has_vnni = False
+    if has_vnni:
+        return AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    return AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+def model_dir(model_id: str) -> str:
+    return os.path.join(ONNX_MODEL_DIR, model_id.replace("/", "__"))
+
+# --- 2. Export and Quantization ---
+def export_quantized_model(task: str, model_id: str) -> str:
+    """
+    Exports a Hugging Face model to ONNX and applies dynamic int8 quantization.
+
+    Returns:
+        str: The folder holding the quantized model and its tokenizer.
+    """
+    from optimum.onnxruntime import ORTQuantizer
+    from transformers import AutoTokenizer
+
+    output_dir = model_dir(model_id)
+    export_dir = os.path.join(output_dir, "fp32")
+    logger.info("Exporting '%s' to ONNX...", model_id)
+    model = _model_classes(task).from_pretrained(model_id, export=True)
+    model.save_pretrained(export_dir)
+
+    logger.info("Quantizing '%s' to int8...", model_id)
+    quantizer = ORTQuantizer.from_pretrained(export_dir)
+    quantizer.quantize(save_dir=output_dir, quantization_config=_quantization_config())
+    AutoTokenizer.from_pretrained(model_id).save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+    return output_dir
+
+# --- 3. Pipeline Construction ---
+def build_pipeline(task: str, model_id: str, **pipeline_kwargs):
+    """
+    Returns a transformers pipeline backed by the quantized ONNX model, exporting
+    it first if needed. It has the same call signature and outputs as the stock
+    PyTorch pipeline, so extract_entities works with either.
+    """
+    import onnxruntime
+    from transformers import AutoTokenizer, pipeline
+
+    folder = model_dir(model_id)
+    if not os.path.exists(os.path.join(folder, QUANTIZED_FILE_NAME)):
+        export_quantized_model(task, model_id)
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if ONNX_INTRA_OP_THREADS:
+        session_options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+
+    model = _model_classes(task).from_pretrained(
+        folder, file_name=QUANTIZED_FILE_NAME, session_options=session_options
+    )
+    tokenizer = AutoTokenizer.from_pretrained(folder)
+    return pipeline(task, model=model, tokenizer=tokenizer, **pipeline_kwargs)
+
+# --- 4. Backend Comparison ---
+def _run_backend(backend: str, texts: list, queue):
+    # Runs in a child process for compare_backends
+    os.environ["ENTITY_BACKEND"] = backend
+    from nlp import entity_extractor
+
+    entity_extractor.load_ner_model()
+    entity_extractor.load_emotion_model()
+    ner_outputs, emotion_outputs, latencies = [], [], []
+    for text in texts:
+        start = time.perf_counter()
+        ner_results = entity_extractor.ner_pipeline(text)
+        emotion_label = entity_extractor.emotion_pipeline(text)[0]['label']
+        latencies.append(time.perf_counter() - start)
+        ner_outputs.append(sorted((e['entity_group'], e['word']) for e in ner_results))
+        emotion_outputs.append(emotion_label)
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((ner_outputs, emotion_outputs, latencies, peak_rss_mb))
+
+def compare_backends(candidate: str, texts: list, baseline: str = "torch"):
+    """
+    Runs the NER and emotion models of two ENTITY_BACKENDs over the same texts and
+    prints entity and mood agreement, per-call latency and peak RSS. Each backend
+    runs in its own process so their memory use doesn't mix.
+    """
+    import multiprocessing
+    import statistics
+
+    from nlp.entity_extractor import EMOTION_TO_MOOD_MAP
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for backend in (baseline, candidate):
+        queue = context.Queue()
+        process = context.Process(target=_run_backend, args=(backend, texts, queue))
+        process.start()
+        results[backend] = queue.get()
+        process.join()
+
+    (base_ner, base_emotion, _, _) = results[baseline]
+    (cand_ner, cand_emotion, _, _) = results[candidate]
+
+    def first(entities, group):
+        return next((word for entity_group, word in entities if entity_group == group), None)
+
+    count = len(texts)
+    print(f"\n--- {candidate} vs {baseline} on {count} commands ---")
+    print(f"NER exact agreement:       {sum(a == b for a, b in zip(base_ner, cand_ner)) / count:.3f}")
+    for group in ("PER", "LOC"):
+        agreement = sum(first(a, group) == first(b, group) for a, b in zip(base_ner, cand_ner)) / count
+        print(f"First {group} agreement:       {agreement:.3f}")
+    print(f"Emotion label agreement:   {sum(a == b for a, b in zip(base_emotion, cand_emotion)) / count:.3f}")
+    mood_agreement = sum(
+        EMOTION_TO_MOOD_MAP.get(a, 'neutral') == EMOTION_TO_MOOD_MAP.get(b, 'neutral')
+        for a, b in zip(base_emotion, cand_emotion)
+    ) / count
+    print(f"Mood agreement:            {mood_agreement:.3f}")
+    for name in (baseline, candidate):
+        _, _, latencies, rss = results[name]
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        print(
+            f"{name:>5}: mean {statistics.mean(latencies) * 1000:.1f} ms, "
+            f"p95 {p95 * 1000:.1f} ms, peak RSS {rss:.0f} MB"
+        )
+
+# --- Testing Block ---
+# Compares the ONNX backend with the PyTorch pipelines on dataset.csv:
+# python -m nlp.onnx_backend [max_rows]
+if __name__ == "__main__":
+    import csv
+    import sys
+
+    from nlp.local_intent import DATASET_PATH
+
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    with open(DATASET_PATH, newline="", encoding="utf-8") as f:
+        texts = [row["text"] for row in csv.DictReader(f) if row.get("text")][:max_rows]
+    compare_backends("onnx", texts)
@@ -0,0 +1,181 @@
+# backend/nlp/session_context.py
+# Conversation context for follow-up commands. A client that sends a session id
+# gets its last intent and entities remembered, so short follow-ups work:
+#   "what's the weather in Mumbai" -> "what about in Delhi?"  (intent inherited)
+#   "call Soni"                    -> "call her again"        (contact reused, no NER)
+#   "play some hindi songs"        -> "something more upbeat" (language kept, new mood)
+# Inherited results also skip the stages that would recompute them: the Space call
+# for an inherited intent, and NER/emotion when the entities are reused as they are.
+#
+# Sessions are kept in memory, in an LRU with idle expiry, so their memory use
+# is bounded by SESSION_MAX_COUNT. When the shared cache is on (SHARED_CACHE, see
+# core/shared_cache.py), every update is also written there and each command
+# starts by refreshing its session from it, so a POST /process-command follow-up
+# finds its session whichever worker it reaches. Without it, sessions are per
+# process, which is only safe with one worker (the WEB_CONCURRENCY default).
+
+import logging
+import os
+import re
+import time
+
+from core.cache import TTLCache
+from core.metrics import metrics
+from core.shared_cache import shared_cache
+from nlp.intent_classifier import confident_local_intent
+
+logger = logging.getLogger(__name__)
+
+# --- 1. Configuration ---
+# A session is forgotten after SESSION_IDLE_SECONDS without a command, and the
+# least recently used sessions are dropped beyond SESSION_MAX_COUNT.
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "300"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+# Longer commands are treated as new requests, never as follow-ups.
+FOLLOW_UP_MAX_WORDS = int(os.getenv("FOLLOW_UP_MAX_WORDS", "6"))
+
+# Entity fields a follow-up of the same intent keeps unless it names a new value.
+# A music follow-up usually asks for something different, so only the language
+# carries over; the mood is always taken from the new command.
+INHERITED_FIELDS = {
+    "get_weather": ("location",),
+    "navigate": ("location",),
+    "call_person": ("contact_name",),
+    "play_music": ("language",),
+}
+
+FOLLOW_UPS = metrics.counter(
+    "assistant_follow_ups_total",
+    "Follow-up commands, by what they inherited (intent, entities, fields).",
+)
+SESSIONS = metrics.gauge("assistant_sessions", "Conversation sessions held in memory.")
+
+# --- 2. Follow-up Detection ---
+# "what about ...", "and in Delhi", "now call Mom", "something calmer"
+_FOLLOW_UP_START = re.compile(
+    r"^(what about|how about|and|also|now|then|instead|same|again|another|one more|something|more|less)\b"
+)
+# Words that point back at the previous command's entities
+_REFERENCE = re.compile(r"\b(her|him|them|there|again|same|that one|that place|that song|the same)\b")
+_WORD = re.compile(r"[a-z']+")
+
+def _words(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+def is_follow_up(text: str) -> bool:
+    """Short commands that continue the previous one ("what about in Delhi?", "call her again")."""
+    words = _words(text)
+    if not words or len(words.split()) > FOLLOW_UP_MAX_WORDS:
+        return False
+    return bool(_FOLLOW_UP_START.match(words) or _REFERENCE.search(words))
+
+def refers_back(text: str) -> bool:
+    """Follow-ups that mean the previous entities as they were ("call her again", "navigate there")."""
+    return is_follow_up(text) and bool(_REFERENCE.search(_words(text)))
+
+# --- 3. Inheritance ---
+def inherit_intent(previous: dict | None, text: str) -> str | None:
+    """
+    Returns the previous intent for a follow-up, or None if the command must be
+    classified. The local model is checked first (it's in-process), so a short
+    command that confidently means something else ("now call Mom") isn't misread.
+    Without a local model nothing is inherited, since there is nothing to check with.
+    """
+    if not previous or not is_follow_up(text):
+        return None
+    available, local_intent = confident_local_intent(text)
+    if not available or (local_intent and local_intent != previous["intent"]):
+        return None
+    FOLLOW_UPS.inc(inherited="intent")
+    return previous["intent"]
+
+def reusable_entities(previous: dict | None, intent: str | None, text: str) -> dict | None:
+    """
+    The previous entities, if this command refers back to them under the same
+    intent; entity extraction can then be skipped entirely.
+    """
+    if not previous or previous["intent"] != intent or not refers_back(text):
+        return None
+    FOLLOW_UPS.inc(inherited="entities")
+    return dict(previous["entities"])
+
+def merge_entities(previous: dict | None, intent: str | None, entities: dict) -> dict:
+    """Fills the fields a same-intent follow-up left empty from the previous entities."""
+    if not previous or previous["intent"] != intent:
+        return entities
+    merged = dict(entities)
+    for field in INHERITED_FIELDS.get(intent, ()):
+        if not merged.get(field) and previous["entities"].get(field):
+            merged[field] = previous["entities"][field]
+            FOLLOW_UPS.inc(inherited="fields")
+    return merged
+
+# --- 4. The Session Store ---
+class SessionStore:
+    """
+    session id -> {"intent", "entities", "updated_at"} of the session's last
+    understood command, backed by the shared cache's "session" namespace.
+    """
+
+    def __init__(self, max_sessions: int = 10000, idle_seconds: float = 300.0):
+        self._sessions = TTLCache(maxsize=max_sessions, ttl=idle_seconds)
+        shared_cache.namespace("session", default_ttl=idle_seconds)
+
+    def get(self, session_id: str | None) -> dict | None:
+        if not session_id:
+            return None
+        return self._sessions.get(session_id)
+
+    def update(self, session_id: str | None, intent: str | None, entities: dict):
+        """Remembers a command's results and restarts the session's idle timer."""
+        if not session_id or not intent:
+            return
+        session = {"intent": intent, "entities": dict(entities), "updated_at": time.time()}
+        self._sessions.set(session_id, session)
+        shared_cache.set("session", session_id, session)
+        SESSIONS.set(len(self._sessions))
+
+    async def refresh(self, session_id: str | None):
+        """
+        Takes the session from the shared cache if another worker has updated it
+        since this one last saw it. Called once at the start of each command.
+        """
+        if not session_id or not shared_cache.enabled:
+            return
+        shared, _ = await shared_cache.lookup_async("session", session_id)
+        local = self._sessions.get(session_id)
+        # A newer local copy wins: its shared write may still be queued
+        if shared and (local is None or shared["updated_at"] > local["updated_at"]):
+            self._sessions.set(session_id, shared)
+            SESSIONS.set(len(self._sessions))
+
+    def end(self, session_id: str | None):
+        # Only the local copy: ended sessions are anonymous ones whose id is never
+        # sent again, so their shared copy just expires
+        if session_id:
+            self._sessions.delete(session_id)
+            SESSIONS.set(len(self._sessions))
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+sessions = SessionStore(max_sessions=SESSION_MAX_COUNT, idle_seconds=SESSION_IDLE_SECONDS)
+
+# --- Testing Block ---
+# To run it, open a terminal in your `backend` folder and type:
+# python -m nlp.session_context
+if __name__ == "__main__":
+    from core.logging_config import configure_logging
+    configure_logging("DEBUG")
+    print("\n--- Testing Session Context ---")
+
+    for text in ["what about in Delhi?", "call her again", "something more upbeat",
+                 "navigate there", "play some sad hindi songs for me"]:
+        print(f"'{text}': follow-up={is_follow_up(text)}, refers back={refers_back(text)}")
+
+    sessions.update("demo", "get_weather", {"location": "Mumbai", "contact_name": None})
+    previous = sessions.get("demo")
+    print(f"\nPrevious: {previous}")
+    intent = inherit_intent(previous, "what about tomorrow?")
+    print(f"'what about tomorrow?' -> intent {intent}, entities "
+          f"{merge_entities(previous, intent, {'location': None, 'contact_name': None})}")
@@ -3,13 +3,38 @@
 import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios'; // Import axios
 
+// The backend server (http://localhost:8000 when running locally)
+const API_BASE = "https://vishalchand0808-car-ai-backend.hf.space";
+const API_URL = `${API_BASE}/process-command`;
+// Lets follow-ups like "what about in Delhi?" build on the previous command,
+// whether they go over the socket or the POST fallback
+const SESSION_ID = crypto.randomUUID();
+// One WebSocket session carries every command; POST is the fallback
+const WS_URL = `${API_BASE.replace(/^http/, "ws")}/ws?session_id=${SESSION_ID}`;
+// After the socket fails or closes, use POST for a while before reconnecting
+const RECONNECT_DELAY_MS = 5000;
+
+// Shown while the handler for a recognized intent is still working
+const INTENT_STATUS = {
+  play_music: "Finding something to play",
+  get_weather: "Checking the weather",
+  navigate: "Planning the route",
+  adjust_temperature: "Adjusting the temperature",
+  call_person: "Getting ready to call",
+};
+
 function App() {
   const [messages, setMessages] = useState([
     { sender: 'assistant', text: "Hello! I'm your in-car assistant. How can I help you?" }
   ]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [status, setStatus] = useState(null);
   const messagesEndRef = useRef(null);
+  const socketRef = useRef(null);
+  const pendingRef = useRef(new Map()); // command id -> { resolve, onEvent }
+  const nextIdRef = useRef(1);
+  const retryAtRef = useRef(0);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -17,20 +42,69 @@ function App() {
 
   useEffect(() => {
     scrollToBottom();
-  }, [messages, isLoading]);
+  }, [messages, isLoading, status]);
+
+  // Close the session when the app unmounts
+  useEffect(() => () => socketRef.current?.close(), []);
+
+  // --- WebSocket session: opened on the first command and kept open ---
+  // Resolves to the open socket, or null if the backend can't be reached this way.
+  const openSocket = () => {
+    const current = socketRef.current;
+    if (current && current.readyState <= WebSocket.OPEN) return current.ready;
+    if (Date.now() < retryAtRef.current) return Promise.resolve(null);
+
+    const socket = new WebSocket(WS_URL);
+    socket.ready = new Promise((resolve) => {
+      socket.onopen = () => resolve(socket);
+      socket.onerror = () => resolve(null);
+    });
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      const pending = pendingRef.current.get(message.id);
+      if (!pending) return;
+      if (message.event === "response" || message.event === "error") {
+        pendingRef.current.delete(message.id);
+        pending.resolve(message.event === "response" ? message.response : null);
+      } else {
+        pending.onEvent(message);
+      }
+    };
+    socket.onclose = () => {
+      // Commands still waiting for an answer are retried over POST
+      pendingRef.current.forEach((pending) => pending.resolve(null));
+      pendingRef.current.clear();
+      socketRef.current = null;
+      retryAtRef.current = Date.now() + RECONNECT_DELAY_MS;
+    };
+    socketRef.current = socket;
+    return socket.ready;
+  };
+
+  // Sends a command over the session. `onEvent` receives the progress events
+  // ("intent", "entities"); resolves to the response text, or null on failure.
+  const sendOverSocket = async (text, onEvent) => {
+    const socket = await openSocket();
+    if (!socket || socket.readyState !== WebSocket.OPEN) return null;
+    const id = nextIdRef.current++;
+    return new Promise((resolve) => {
+      pendingRef.current.set(id, { resolve, onEvent });
+      socket.send(JSON.stringify({ id, text }));
+    });
+  };
 
   // --- UPDATED: Function to connect to our FastAPI backend ---
   const sendMessageToBackend = async (text) => {
-    // The backend server will be running on http://localhost:8000
-    const API_URL = "https://vishalchand0808-car-ai-backend.hf.space/process-command";
-    
     try {
       const response = await axios.post(API_URL, {
         text: text, // Send the user's text in the request body
+        session_id: SESSION_ID,
       });
       // Return the response text from the backend
       return response.data.response;
     } catch (error) {
+      // An overloaded backend still answers (503), with a message worth showing
+      if (error.response?.data?.response) return error.response.data.response;
       console.error("Error connecting to the backend:", error);
       // Return a user-friendly error message
       return "Sorry, I'm having trouble connecting to my brain right now.";
@@ -45,12 +119,19 @@ function App() {
     setMessages(prev => [...prev, userMessage]);
     setInput('');
     setIsLoading(true);
+    setStatus(null);
 
-    const assistantResponseText = await sendMessageToBackend(input);
+    // The intent arrives before the handler has finished, so say what's happening meanwhile
+    const onEvent = (message) => {
+      if (message.event === "intent") setStatus(INTENT_STATUS[message.intent] || null);
+    };
+    const assistantResponseText =
+      (await sendOverSocket(input, onEvent)) ?? (await sendMessageToBackend(input));
     const assistantMessage = { sender: 'assistant', text: assistantResponseText };
     
     setMessages(prev => [...prev, assistantMessage]);
     setIsLoading(false);
+    setStatus(null);
   };
 
   return (
@@ -68,7 +149,7 @@ function App() {
         {isLoading && (
           <div className="message assistant">
             <p className="loading-dots">
-              <span>.</span><span>.</span><span>.</span>
+              {status}<span>.</span><span>.</span><span>.</span>
             </p>
           </div>
         )}